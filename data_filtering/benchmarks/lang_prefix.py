@@ -0,0 +1,63 @@
+import argparse
+import logging
+import time
+from pathlib import Path
+
+import fasttext
+import numpy as np
+
+from data_filtering.filtering_utilities.extract_text import extract_text
+from data_filtering.filtering_utilities.language_identification import (language_identification_batch,
+                                                                        language_identification_prefix_batch)
+from data_filtering.utils import setup_logging
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Prefix vs full-text language ID: speedup and agreement")
+    parser.add_argument("--fixtures", type=str, default="tests/fixtures")
+    parser.add_argument("--model", type=str, default="classifier_models/fasttext_language_ID.bin")
+    parser.add_argument("--lang", type=str, default="en")
+    parser.add_argument("--confidence", type=float, default=0.90)
+    parser.add_argument("--margin", type=float, default=0.05)
+    parser.add_argument("--prefix_chars", type=int, nargs="+", default=[500, 1000, 2000, 5000])
+    parser.add_argument("--repeat", type=int, default=20,
+                        help="Passes over the documents for each timing.")
+    return parser.parse_args()
+
+
+def load_documents(fixtures: Path) -> list[str]:
+    documents = []
+    for path in sorted(fixtures.rglob("*")):
+        if path.suffix == ".html":
+            documents.append(extract_text(path.read_bytes()))
+        elif path.is_file() and path.suffix in ("", ".txt"):
+            documents.append(path.read_text(encoding="utf-8", errors="ignore"))
+    return [doc for doc in documents if doc.strip()]
+
+
+def timed(fn, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return result, (time.perf_counter() - start) / repeat
+
+
+if __name__ == "__main__":
+    setup_logging()
+    args = parse_args()
+    model = fasttext.load_model(args.model)
+    documents = load_documents(Path(args.fixtures))
+    logging.info(f"{len(documents)} documents, {sum(map(len, documents)) / len(documents):.0f} chars on average")
+
+    (full_labels, full_scores), full_seconds = timed(
+        lambda: language_identification_batch(documents, model), args.repeat)
+    full_keep = (full_labels == args.lang) & (full_scores >= args.confidence)
+
+    print(f"{'prefix':>8} {'speedup':>8} {'labels':>8} {'decisions':>10} {'fallback':>9}")
+    for prefix_chars in args.prefix_chars:
+        (labels, scores, fallback), seconds = timed(
+            lambda: language_identification_prefix_batch(documents, model, args.lang, args.confidence,
+                                                         prefix_chars, args.margin), args.repeat)
+        keep = (labels == args.lang) & (scores >= args.confidence)
+        print(f"{prefix_chars:>8} {full_seconds / seconds:>7.2f}x {np.mean(labels == full_labels):>8.1%} "
+              f"{np.mean(keep == full_keep):>10.1%} {np.mean(fallback):>9.1%}")
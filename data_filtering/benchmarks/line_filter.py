@@ -0,0 +1,70 @@
+import argparse
+import logging
+from pathlib import Path
+
+from data_filtering.benchmarks.lang_prefix import load_documents, timed
+from data_filtering.filtering_utilities.filter_lines import filter_lines
+from data_filtering.filtering_utilities.filter_lists import BLACKLIST
+from data_filtering.utils import setup_logging
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Single-pass vs per-character line filter: speedup and identical output")
+    parser.add_argument("--fixtures", type=str, default="tests/fixtures")
+    parser.add_argument("--min_words", type=int, default=6)
+    parser.add_argument("--repeat", type=int, default=20,
+                        help="Passes over the documents for each timing.")
+    return parser.parse_args()
+
+
+def filter_lines_reference(text: str,
+                           min_words: int = 3,
+                           max_chars_per_line: int = 500,
+                           ) -> str:
+    # The previous implementation, one Python pass per character class
+    kept = []
+
+    for line in text.splitlines():
+        lw = line.strip().lower()
+        words = lw.split()
+        if len(words) < min_words:
+            continue
+        if len(line) > max_chars_per_line:
+            continue
+
+        if any(blk in lw for blk in BLACKLIST):
+            continue
+
+        if '<' in line or 'http://' in lw or 'https://' in lw:
+            continue
+
+        non_alpha = sum(1 for c in line if not c.isalnum() and not c.isspace())
+        if non_alpha / max(1, len(words)) > 0.5:
+            continue
+
+        digits = sum(1 for c in line if c.isdigit())
+        if digits / max(1, len(line)) > 0.2:
+            continue
+
+        non_ascii = sum(1 for c in line if ord(c) > 127)
+        if non_ascii / max(1, len(line)) > 0.2:
+            continue
+
+        kept.append(line)
+    return "\n".join(kept)
+
+
+if __name__ == "__main__":
+    setup_logging()
+    args = parse_args()
+    documents = load_documents(Path(args.fixtures))
+    logging.info(f"{len(documents)} documents, {sum(map(len, documents)) / len(documents):.0f} chars on average")
+
+    reference, reference_seconds = timed(
+        lambda: [filter_lines_reference(doc, args.min_words) for doc in documents], args.repeat)
+    single_pass, single_pass_seconds = timed(
+        lambda: [filter_lines(doc, args.min_words) for doc in documents], args.repeat)
+
+    print(f"{'reference':>10} {'single-pass':>11} {'speedup':>8} {'identical':>10}")
+    print(f"{reference_seconds * 1e3:>8.2f}ms {single_pass_seconds * 1e3:>9.2f}ms "
+          f"{reference_seconds / single_pass_seconds:>7.2f}x {sum(map(str.__eq__, reference, single_pass)):>4}/{len(documents)}")
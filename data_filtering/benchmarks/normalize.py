@@ -0,0 +1,80 @@
+import argparse
+import logging
+import re
+import string
+import sys
+import unicodedata
+from pathlib import Path
+
+from data_filtering.benchmarks.lang_prefix import load_documents, timed
+from data_filtering.data_pipeline.shards import is_shard, iter_documents
+from data_filtering.deduplication.utils import normalize
+from data_filtering.utils import setup_logging
+
+# Non-English CC text is where the per-character passes cost the most
+MULTILINGUAL_TEXTS = [
+    "Ça, c'est très naïf — « déjà vu » au café!\tÉté 2024 : 12,5 % de hausse.",
+    "Übergrößenträger müssen Straßenschäden melden.\r\nFür Rückfragen: +49 (0)30 123456",
+    "Ελληνικά κείμενα με τόνους· ΑΘΗΝΑ, Ἀθῆναι.",
+    "Привет, мир! Ёжик в тумане…​​конец.",
+    "日本語のテキスト、句読点。　全角スペース「引用」",
+    "Tiếng Việt có rất nhiều dấu: ắ ằ ẳ ẵ ặ.﻿",
+    "İstanbul'da ılık bir gün; ŞİŞLİ.\u0085 next",
+    "نص عربي مع تشكيل: كَتَبَ الوَلَدُ.",
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Table-driven vs multi-pass dedup normalization: speedup and output")
+    parser.add_argument("--fixtures", type=str, default="tests/fixtures")
+    parser.add_argument("--shards", type=str, nargs="*", default=[],
+                        help="Stage 1 output shards, or directories of them, whose documents are added to the set.")
+    parser.add_argument("--repeat", type=int, default=20,
+                        help="Passes over the documents for each timing.")
+    return parser.parse_args()
+
+
+def normalize_reference(text: str) -> str:
+    # The previous implementation, six passes per document
+    text = text.lower()
+    text = unicodedata.normalize("NFD", text)
+    text = "".join(char for char in text if unicodedata.category(char) != "Mn")
+    text = "".join(ch for ch in text if not unicodedata.category(ch).startswith("C"))
+    text = text.translate(str.maketrans("", "", string.punctuation))
+    text = re.sub(r"\s+", " ", text).strip()
+    return text
+
+
+def shard_documents(paths: list[str]) -> list[str]:
+    documents = []
+    for path in map(Path, paths):
+        shards = sorted(p for p in path.rglob("*") if is_shard(p)) if path.is_dir() else [path]
+        for shard in shards:
+            documents.extend(text for _, text in iter_documents(shard))
+    return documents
+
+
+def code_point_mismatches() -> int:
+    # Every code point alone and between words, so whitespace and deletions are covered too
+    mismatches = 0
+    for code in range(sys.maxunicode + 1):
+        if 0xD800 <= code <= 0xDFFF:
+            continue
+        for text in (chr(code), f"a{chr(code)}b c"):
+            mismatches += normalize(text) != normalize_reference(text)
+    return mismatches
+
+
+if __name__ == "__main__":
+    setup_logging()
+    args = parse_args()
+    documents = load_documents(Path(args.fixtures)) + shard_documents(args.shards) + MULTILINGUAL_TEXTS
+    logging.info(f"{len(documents)} documents, {sum(map(len, documents)) / len(documents):.0f} chars on average")
+
+    reference, reference_seconds = timed(lambda: [normalize_reference(doc) for doc in documents], args.repeat)
+    table, table_seconds = timed(lambda: [normalize(doc) for doc in documents], args.repeat)
+
+    print(f"{'reference':>10} {'table':>9} {'speedup':>8} {'identical':>10}")
+    print(f"{reference_seconds * 1e3:>8.2f}ms {table_seconds * 1e3:>7.2f}ms "
+          f"{reference_seconds / table_seconds:>7.2f}x {sum(map(str.__eq__, reference, table)):>4}/{len(documents)}")
+    print(f"code points normalized differently: {code_point_mismatches()}")
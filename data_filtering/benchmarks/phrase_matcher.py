@@ -0,0 +1,41 @@
+import argparse
+import logging
+from pathlib import Path
+
+from data_filtering.benchmarks.lang_prefix import load_documents, timed
+from data_filtering.filtering_utilities.filter_lists import BLACKLIST, DOMAIN_KEYWORDS
+from data_filtering.filtering_utilities.phrase_matcher import get_phrase_matcher
+from data_filtering.utils import setup_logging
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Aho-Corasick vs one substring scan per phrase: speedup and agreement")
+    parser.add_argument("--fixtures", type=str, default="tests/fixtures")
+    parser.add_argument("--repeat", type=int, default=20,
+                        help="Passes over the documents for each timing.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    setup_logging()
+    args = parse_args()
+    documents = [doc.lower() for doc in load_documents(Path(args.fixtures))]
+    lines = [line.strip() for doc in documents for line in doc.splitlines()]
+    logging.info(f"{len(documents)} documents, {len(lines)} lines")
+    matcher = get_phrase_matcher()
+
+    print(f"{'check':>18} {'scan':>9} {'automaton':>10} {'speedup':>8} {'agreement':>10}")
+    checks = [
+        ("blacklist (lines)",
+         lambda: [any(blk in line for blk in BLACKLIST) for line in lines],
+         lambda: [matcher.contains_any(line, "blacklist") for line in lines]),
+        ("domain (docs)",
+         lambda: [sum(1 for kw in DOMAIN_KEYWORDS if kw in doc) for doc in documents],
+         lambda: [len(matcher.matches(doc, "domain")) for doc in documents]),
+    ]
+    for name, scan_fn, automaton_fn in checks:
+        scan, scan_seconds = timed(scan_fn, args.repeat)
+        automaton, automaton_seconds = timed(automaton_fn, args.repeat)
+        agreement = sum(a == b for a, b in zip(scan, automaton)) / len(scan)
+        print(f"{name:>18} {scan_seconds * 1e3:>7.2f}ms {automaton_seconds * 1e3:>8.2f}ms "
+              f"{scan_seconds / automaton_seconds:>7.2f}x {agreement:>10.1%}")
@@ -0,0 +1,137 @@
+import argparse
+import gzip
+import logging
+import os
+import re
+from functools import partial
+from http import HTTPStatus
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from pathlib import Path
+
+from data_filtering.data_pipeline.utils import matches_kind
+from data_filtering.utils import setup_logging
+
+RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)$")
+PATH_INDEXES = {"warc.paths.gz": False, "wet.paths.gz": True}
+
+
+def build_paths_index(root: str | os.PathLike, is_wet: bool) -> bytes:
+    # Same layout as the Common Crawl index: one root-relative path per line, gzipped
+    root = Path(root)
+    paths = sorted(p.relative_to(root).as_posix() for p in root.rglob("*") if matches_kind(p.name, is_wet))
+    return gzip.compress(("\n".join(paths) + "\n").encode("utf-8"), mtime=0)
+
+
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    # Returns the inclusive byte range, None for a full response, raises ValueError when unsatisfiable
+    if header is None:
+        return None
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+
+    start, end = match.groups()
+    if not start:
+        if not end or int(end) == 0:
+            raise ValueError(header)
+        return max(0, size - int(end)), size - 1
+
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    # Serves a directory of WARC/WET shards like data.commoncrawl.org, with Range support.
+    # Missing warc.paths.gz / wet.paths.gz indexes are generated from the shards on disk.
+
+    def do_GET(self):
+        self.serve(send_body=True)
+
+    def do_HEAD(self):
+        self.serve(send_body=False)
+
+    def serve(self, send_body: bool):
+        path = Path(self.translate_path(self.path))
+        if path.is_file():
+            size = path.stat().st_size
+            source = open(path, "rb")
+        elif path.name in PATH_INDEXES:
+            content = build_paths_index(self.directory, PATH_INDEXES[path.name])
+            size = len(content)
+            source = BytesIO(content)
+        else:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return
+
+        with source:
+            try:
+                byte_range = parse_range(self.headers.get("Range"), size)
+            except ValueError:
+                self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            start, end = byte_range if byte_range else (0, size - 1)
+            length = end - start + 1 if size else 0
+
+            self.send_response(HTTPStatus.PARTIAL_CONTENT if byte_range else HTTPStatus.OK)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(length))
+            self.send_header("Accept-Ranges", "bytes")
+            if byte_range:
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            self.end_headers()
+
+            if send_body and length:
+                source.seek(start)
+                copy_bytes(source, self.wfile, length)
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} {format % args}")
+
+
+def copy_bytes(source, destination, length: int, chunk_size: int = 1024 * 1024):
+    while length > 0:
+        chunk = source.read(min(chunk_size, length))
+        if not chunk:
+            break
+        destination.write(chunk)
+        length -= len(chunk)
+
+
+def make_server(root: str | os.PathLike, host: str = "127.0.0.1", port: int = 8000) -> ThreadingHTTPServer:
+    handler = partial(RangeRequestHandler, directory=str(root))
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve local WARC/WET shards as a Common Crawl mirror")
+
+    parser.add_argument("--root", required=True, type=str,
+                        help="Directory holding the shards.")
+    parser.add_argument("--host", default="127.0.0.1", type=str,
+                        help="Interface to bind.")
+    parser.add_argument("--port", default=8000, type=int,
+                        help="Port to listen on.")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    setup_logging()
+    args = parse_args()
+    server = make_server(args.root, args.host, args.port)
+    logging.info(f"Serving {args.root} on http://{args.host}:{server.server_port}, "
+                 f"use --base_url http://{args.host}:{server.server_port} in Stage 1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,96 @@
+import gzip
+import json
+import os
+import uuid
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+SHARD_SUFFIX = ".jsonl.gz"
+INDEX_SUFFIX = ".idx"
+# Documents inside a packed shard are referenced as "<shard path>::<doc id>"
+DOC_REF_SEP = "::"
+
+
+def is_shard(path: str | os.PathLike) -> bool:
+    return str(path).endswith(SHARD_SUFFIX)
+
+
+def index_path(shard_path: str | os.PathLike) -> Path:
+    shard_path = str(shard_path)
+    return Path(shard_path[:-len(SHARD_SUFFIX)] + INDEX_SUFFIX)
+
+
+class ShardWriter:
+    # Each document is its own gzip member, so the shard is still a plain .jsonl.gz
+    # for sequential readers while the sidecar index gives the byte range of every document.
+    def __init__(self, shard_path: str | os.PathLike, compresslevel: int = 6):
+        self.shard_path = Path(shard_path)
+        self.compresslevel = compresslevel
+        self.num_docs = 0
+        self._shard = open(self.shard_path, "wb")
+        self._index = open(index_path(self.shard_path), "w", encoding="utf-8")
+
+    def write(self, text: str, doc_id: str | None = None) -> str:
+        doc_id = doc_id or uuid.uuid4().hex
+        line = json.dumps({"id": doc_id, "text": text}, ensure_ascii=False) + "\n"
+        member = gzip.compress(line.encode("utf-8"), compresslevel=self.compresslevel, mtime=0)
+        return self.write_member(doc_id, member)
+
+    def write_member(self, doc_id: str, member: bytes) -> str:
+        # A document already compressed by another ShardWriter, copied without recompressing it
+        offset = self._shard.tell()
+        self._shard.write(member)
+        self._index.write(f"{doc_id}\t{offset}\t{len(member)}\n")
+        self.num_docs += 1
+        return doc_id
+
+    def close(self):
+        self._shard.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_documents(shard_path: str | os.PathLike) -> Iterator[Tuple[str, str]]:
+    with gzip.open(shard_path, "rt", encoding="utf-8") as f:
+        for line in f:
+            doc = json.loads(line)
+            yield doc["id"], doc["text"]
+
+
+@lru_cache(maxsize=64)
+def load_index(shard_path: str) -> Dict[str, Tuple[int, int]]:
+    index = {}
+    with open(index_path(shard_path), "r", encoding="utf-8") as f:
+        for line in f:
+            doc_id, offset, length = line.rstrip("\n").split("\t")
+            index[doc_id] = (int(offset), int(length))
+    return index
+
+
+def read_document(shard_path: str | os.PathLike, doc_id: str) -> str:
+    offset, length = load_index(str(shard_path))[doc_id]
+    with open(shard_path, "rb") as f:
+        f.seek(offset)
+        member = f.read(length)
+    return json.loads(gzip.decompress(member))["text"]
+
+
+def doc_refs(shard_path: str | os.PathLike) -> List[str]:
+    return [f"{shard_path}{DOC_REF_SEP}{doc_id}" for doc_id in load_index(str(shard_path))]
+
+
+def read_text(path_or_ref: str | os.PathLike) -> str:
+    # Plain text documents and documents packed in a shard are read the same way
+    path_or_ref = str(path_or_ref)
+    if DOC_REF_SEP in path_or_ref:
+        shard_path, doc_id = path_or_ref.rsplit(DOC_REF_SEP, 1)
+        return read_document(shard_path, doc_id)
+
+    with open(path_or_ref, "r", encoding="utf-8", errors="ignore") as f:
+        return f.read()
@@ -1,14 +1,28 @@
 import argparse
+from pathlib import Path
+from data_filtering.data_pipeline.utils import CC_BASE_URL, CRAWL_ID
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Pre-processing of CC files using Asyncio")
 
     parser.add_argument("--num_urls", type=int, default=5,
-                        help="Number of CC samples")
+                        help="Number of CC samples (per host with --num_shards).")
     parser.add_argument("--STAGE1_DIR", required=True, type=str,
                         help="Stage 1 output directory")
     parser.add_argument("--use_wet", action="store_true",
                         help="Whether to use WET files.")
+    parser.add_argument("--input", type=str, default=None,
+                        help="Local directory, path list file or file:// prefix of pre-staged shards.")
+    parser.add_argument("--base_url", type=str, default=CC_BASE_URL,
+                        help="Mirror of data.commoncrawl.org, e.g. a local_server URL or a file:// prefix.")
+    parser.add_argument("--crawl_id", type=str, default=CRAWL_ID,
+                        help="Common Crawl crawl to sample from.")
+    parser.add_argument("--paths_cache", type=str, default=str(Path.home() / ".cache" / "data_filtering" / "cc_paths"),
+                        help="Cache of the crawl path indexes, keyed by base URL and crawl ID. Empty string disables it.")
+    parser.add_argument("--shard_index", type=int, default=0,
+                        help="This host's slice of the seeded sample, in [0, num_shards).")
+    parser.add_argument("--num_shards", type=int, default=1,
+                        help="Number of hosts splitting the sample into disjoint subsets.")
     parser.add_argument("--concurrency", type=int, default=16,
                         help="Concurrency for downloads and processing.")
     parser.add_argument("--num_workers", type=int, default=16,
@@ -17,6 +31,52 @@ def parse_args():
                         help="Chunk size for downloading files in MB.")
     parser.add_argument("--max_concurrent_downloads", type=int, default=16,
                         help="Max simultaneous downloads (and temp files) at any time")
+    parser.add_argument("--fixed_download_concurrency", action="store_true",
+                        help="Keep max_concurrent_downloads transfers instead of adapting to the workers and bandwidth.")
+    parser.add_argument("--control_interval", type=float, default=5.0,
+                        help="Seconds between two adjustments of the download concurrency.")
+    parser.add_argument("--range_parts", type=int, default=1,
+                        help="Byte ranges of one shard fetched concurrently, 1 downloads each shard as a single stream.")
+    parser.add_argument("--range_MB", type=int, default=16,
+                        help="Size of each byte range in MB, buffered in memory until its turn.")
+    parser.add_argument("--range_retries", type=int, default=3,
+                        help="Retries per byte range, resuming after the bytes already received.")
+    parser.add_argument("--stream", action="store_true",
+                        help="Pipe downloads straight into the workers instead of spilling to temp files.")
+    parser.add_argument("--stream_buffer_MB", type=int, default=1,
+                        help="Pipe buffer size per streamed shard in MB.")
+
+    parser.add_argument("--header_filter", action="store_true",
+                        help="Skip records from their headers alone, before reading the payload.")
+    parser.add_argument("--allowed_status", type=int, nargs="*", default=[200],
+                        help="HTTP status codes kept by the header filter, none keeps every status.")
+    parser.add_argument("--min_record_bytes", type=int, default=0,
+                        help="Smallest WARC record kept by the header filter.")
+    parser.add_argument("--max_record_MB", type=float, default=10.0,
+                        help="Largest WARC record kept by the header filter, 0 disables the bound.")
+    parser.add_argument("--payload_types", type=str, nargs="*", default=["text/html", "application/xhtml+xml"],
+                        help="WARC-Identified-Payload-Type prefixes kept by the header filter, when the header is set.")
+    parser.add_argument("--url_exclude", type=str, default=None,
+                        help="Regex on the target URL, matching records are skipped by the header filter.")
+    parser.add_argument("--domain_blocklist", type=str, default=None,
+                        help="File with one host or registered domain per line, skipped by the header filter.")
+
+    parser.add_argument("--max_payload_MB", type=float, default=0,
+                        help="Skip HTML payloads above this size before extraction, 0 disables the limit.")
+    parser.add_argument("--max_dom_tags", type=int, default=0,
+                        help="Skip HTML payloads with more tags than this before extraction, 0 disables the limit.")
+    parser.add_argument("--extract_timeout", type=float, default=0,
+                        help="Abandon the extraction of a record after this many seconds, 0 disables the limit.")
+    parser.add_argument("--extract_max_timeouts", type=int, default=16,
+                        help="Abandoned extractions per worker after which --extract_timeout stops being enforced, "
+                             "0 never stops.")
+
+    parser.add_argument("--seen_set", action="store_true",
+                        help="Skip records whose payload digest or normalized URL an earlier record already had.")
+    parser.add_argument("--seen_capacity", type=int, default=50_000_000,
+                        help="Expected number of keys in the seen-set Bloom filter, sets its size on creation.")
+    parser.add_argument("--seen_error_rate", type=float, default=0.001,
+                        help="False positive rate of the seen-set at full capacity.")
 
     parser.add_argument("--lang_model", type=str,
                         default="classifier_models/fasttext_language_ID.bin")
@@ -28,10 +88,17 @@ def parse_args():
                         default="classifier_models/quality_fasttext.ftz",
                         help= "Path to fasttext quality classifier")
 
+    parser.add_argument("--model_preload", default="worker", choices=["worker", "fork", "forkserver"],
+                        help="Load the models in every worker, or once before forking them so the pages are shared.")
+
     parser.add_argument("--lang", default="en", type=str,
                         help="Language to filter for.")
     parser.add_argument("--confidence", default=0.90, type=float,
                         help="Min language confidence score.")
+    parser.add_argument("--lang_prefix_chars", default=0, type=int,
+                        help="Identify the language on this many leading characters, 0 uses the full text.")
+    parser.add_argument("--lang_prefix_margin", default=0.05, type=float,
+                        help="Prefix scores this close to --confidence are re-scored on the full text.")
     parser.add_argument("--nsfw_threshold", default=0.95, type=float,
                         help="Min non-nsfw score.")
     parser.add_argument("--hate_threshold", default=0.95, type=float,
@@ -39,10 +106,31 @@ def parse_args():
     parser.add_argument("--quality_threshold", default=0.8, type=float,
                         help="Min quality score.")
 
+    parser.add_argument("--batch_size", type=int, default=64,
+                        help="Documents per fastText micro-batch.")
+    parser.add_argument("--split_records", action="store_true",
+                        help="Split each shard into record batches filtered by the whole worker pool.")
+    parser.add_argument("--records_per_task", type=int, default=256,
+                        help="Raw records per shared-memory batch with --split_records.")
+
+    parser.add_argument("--score_sidecar", action="store_true",
+                        help="Score every extracted document with every filter and keep the scores and candidate "
+                             "texts next to each shard, for re-thresholding without reprocessing.")
+
+    parser.add_argument("--fixed_filter_order", action="store_true",
+                        help="Run the filters in their declared order instead of reordering them by cost and selectivity.")
+
     parser.add_argument("--min_words", type=int, default=6,
                         help="Minimum number of words to keep a line")
 
     parser.add_argument("--seed", default=2025, type=int,
                         help="Seed for reproducibility.")
+    parser.add_argument("--stats_stream", type=str, default=None,
+                        help="Optional JSONL file that receives the stats of each shard as soon as it finishes.")
+    parser.add_argument("--restart", action="store_true",
+                        help="Ignore the ledger in STAGE1_DIR and sample a fresh set of URLs.")
 
-    return parser.parse_args()
\ No newline at end of file
+    args = parser.parse_args()
+    if args.score_sidecar and args.split_records:
+        parser.error("--score_sidecar is not supported with --split_records")
+    return args
\ No newline at end of file
@@ -0,0 +1,145 @@
+import asyncio
+import logging
+import re
+from collections import deque
+from typing import AsyncIterator, Callable
+
+import aiohttp
+
+CONTENT_RANGE_RE = re.compile(r"bytes (\d+)-(\d+)/(\d+)")
+
+
+class RangedDownload:
+    # Splits a shard into byte ranges fetched concurrently over the session's connector,
+    # and yields them back in order. Falls back to a single stream when the server
+    # ignores Range requests or when max_parts is 1.
+    def __init__(self,
+                 session: aiohttp.ClientSession,
+                 url: str,
+                 part_size: int,
+                 max_parts: int = 1,
+                 retries: int = 3,
+                 backoff: float = 1.0,
+                 on_bytes: Callable[[int], None] | None = None):
+        self.session = session
+        self.url = url
+        self.part_size = part_size
+        self.max_parts = max_parts
+        self.retries = retries
+        self.backoff = backoff
+        self.on_bytes = on_bytes
+        self.size = None
+        self._resp = None
+        self._tasks = []
+
+    async def __aenter__(self):
+        # The first range doubles as the probe, so a ranged download costs no extra round trip
+        headers = {"Range": f"bytes=0-{self.part_size - 1}"} if self.max_parts > 1 else None
+        self._resp = await self.session.get(self.url, headers=headers)
+        try:
+            self._resp.raise_for_status()
+        except Exception:
+            self._resp.release()
+            raise
+
+        if self._resp.status == 206:
+            match = CONTENT_RANGE_RE.match(self._resp.headers.get("Content-Range", ""))
+            if match:
+                self.size = int(match.group(3))
+            else:
+                # Without the total size (e.g. "bytes 0-N/*") the remaining ranges are unknown,
+                # streaming this response alone would truncate the shard: fetch it whole instead
+                logging.warning(f"Unusable Content-Range {self._resp.headers.get('Content-Range')!r} "
+                                f"for {self.url}, downloading it as a single stream")
+                self._resp.release()
+                self._resp = await self.session.get(self.url)
+                try:
+                    self._resp.raise_for_status()
+                except Exception:
+                    self._resp.release()
+                    raise
+        return self
+
+    async def __aexit__(self, *exc):
+        for task in self._tasks:
+            task.cancel()
+        # Waiting for the cancelled ranges releases their responses and retrieves their errors
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._resp.release()
+
+    async def iter_chunked(self, chunk_size: int) -> AsyncIterator[bytes]:
+        async for chunk in self._iter_parts(chunk_size):
+            if self.on_bytes is not None:
+                self.on_bytes(len(chunk))
+            yield chunk
+
+    async def _iter_parts(self, chunk_size: int) -> AsyncIterator[bytes]:
+        if self.size is None:
+            async for chunk in self._resp.content.iter_chunked(chunk_size):
+                yield chunk
+            return
+
+        ranges = iter([(start, min(start + self.part_size, self.size) - 1)
+                       for start in range(self.part_size, self.size, self.part_size)])
+        pending = deque()
+
+        def schedule():
+            # The first range counts against the window while it streams
+            while len(pending) < self.max_parts - 1:
+                byte_range = next(ranges, None)
+                if byte_range is None:
+                    return
+                task = asyncio.create_task(self.fetch_range(*byte_range))
+                self._tasks.append(task)
+                pending.append(task)
+
+        schedule()
+        part = await self.fetch_range(0, min(self.part_size, self.size) - 1, self._resp)
+        while True:
+            # Parts are buffered whole, handed out in chunk_size slices like a single stream
+            view = memoryview(part)
+            for start in range(0, len(view), chunk_size):
+                yield view[start:start + chunk_size]
+            if not pending:
+                return
+            part = await pending.popleft()
+            schedule()
+
+    async def fetch_range(self, start: int, end: int, resp: aiohttp.ClientResponse | None = None) -> bytes:
+        buffer = bytearray()
+        for attempt in range(self.retries + 1):
+            try:
+                if resp is None:
+                    # Resume after the bytes that already arrived
+                    resp = await self.session.get(self.url, headers={"Range": f"bytes={start + len(buffer)}-{end}"})
+                    resp.raise_for_status()
+                    if resp.status != 206:
+                        raise aiohttp.ClientPayloadError(f"Expected a partial response, got {resp.status}")
+
+                async for chunk in resp.content.iter_any():
+                    buffer.extend(chunk)
+                if len(buffer) != end - start + 1:
+                    raise aiohttp.ClientPayloadError(f"Range {start}-{end} truncated at {len(buffer)} bytes")
+                return bytes(buffer)
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.retries:
+                    raise
+                logging.warning(f"Retrying range {start}-{end} of {self.url} ({attempt + 1}/{self.retries}): {e}")
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+            finally:
+                if resp is not None:
+                    resp.release()
+                    resp = None
+
+
+def open_download(session: aiohttp.ClientSession,
+                  url: str,
+                  args,
+                  on_bytes: Callable[[int], None] | None = None) -> RangedDownload:
+    return RangedDownload(session,
+                          url,
+                          part_size=args.range_MB * 1024 * 1024,
+                          max_parts=args.range_parts,
+                          retries=args.range_retries,
+                          on_bytes=on_bytes)
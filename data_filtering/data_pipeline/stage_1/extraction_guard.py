@@ -0,0 +1,98 @@
+import concurrent.futures
+import logging
+import threading
+from argparse import Namespace
+from collections import Counter
+from typing import Dict
+
+from data_filtering.filtering_utilities.extract_text import extract_text
+
+extraction_guard = None
+
+
+class ExtractionGuard:
+    # Size checks before the HTML is parsed, and a deadline on the extraction itself.
+    # resiliparse releases the GIL, so a record past its deadline is abandoned to its thread
+    # while the worker moves on; the thread finishes in the background and is reused.
+    # Abandoned threads keep burning CPU: once every thread holds one the pool is replaced,
+    # and after max_timeouts abandoned records the guard stops using threads at all.
+    def __init__(self,
+                 max_bytes: int | None = None,
+                 max_tags: int | None = None,
+                 timeout: float | None = None,
+                 threads: int = 4,
+                 max_timeouts: int | None = None):
+        self.max_bytes = max_bytes
+        self.max_tags = max_tags
+        self.timeout = timeout
+        self.threads = threads
+        self.max_timeouts = max_timeouts
+        self.timeouts = 0
+        self.abandoned = []
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=threads) if timeout else None
+
+    def reject_reason(self, payload: bytes, is_html: bool = True) -> str | None:
+        if self.max_bytes is not None and len(payload) > self.max_bytes:
+            return "extract.payload_size"
+        # Every element starts with "<", a cheap upper bound on the DOM size without parsing it.
+        # WET plain text has no DOM.
+        if is_html and self.max_tags is not None and payload.count(b"<") > self.max_tags:
+            return "extract.dom_size"
+        return None
+
+    def extract(self,
+                html_bytes: bytes,
+                charset: str | None = None,
+                stats: Dict[str, int] | None = None) -> str | None:
+        # None when the deadline passed
+        if self.pool is None:
+            return extract_text(html_bytes, charset, stats)
+
+        started = threading.Event()
+        # An abandoned thread keeps running after the shard's stats are written, it counts into its own dict
+        counts = Counter()
+
+        def run() -> str:
+            started.set()
+            return extract_text(html_bytes, charset, counts)
+
+        future = self.pool.submit(run)
+        # The deadline runs from the start of the extraction, not from the submit: a free thread
+        # always exists (see abandon), the wait only covers the thread hand-off
+        started.wait()
+        try:
+            text = future.result(timeout=self.timeout)
+        except concurrent.futures.TimeoutError:
+            logging.warning(f"Extraction of a {len(html_bytes)} byte record exceeded {self.timeout}s, skipped")
+            self.abandon(future)
+            return None
+        if stats is not None:
+            for key, count in counts.items():
+                stats[key] = stats.get(key, 0) + count
+        return text
+
+    def abandon(self, future: concurrent.futures.Future):
+        self.timeouts += 1
+        self.abandoned = [f for f in self.abandoned if not f.done()] + [future]
+        if self.max_timeouts is not None and self.timeouts >= self.max_timeouts:
+            logging.warning(f"{self.timeouts} extractions exceeded {self.timeout}s, "
+                            f"extracting without a deadline from now on")
+            self.pool.shutdown(wait=False)
+            self.pool = None
+        elif len(self.abandoned) >= self.threads:
+            # Every thread still runs an abandoned extraction, the next record would only queue
+            self.pool.shutdown(wait=False)
+            self.pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.threads)
+            self.abandoned = []
+
+
+def get_extraction_guard(args: Namespace) -> ExtractionGuard:
+    global extraction_guard
+    if extraction_guard is None:
+        extraction_guard = ExtractionGuard(
+            max_bytes=int(args.max_payload_MB * 1024 * 1024) if args.max_payload_MB else None,
+            max_tags=args.max_dom_tags or None,
+            timeout=args.extract_timeout or None,
+            max_timeouts=args.extract_max_timeouts or None,
+        )
+    return extraction_guard
@@ -0,0 +1,86 @@
+import logging
+import time
+from typing import Callable, List
+
+
+class Predicate:
+    def __init__(self,
+                 name: str,
+                 keep_fn: Callable[[object, List[int]], List[int]]):
+        self.name = name
+        # Takes the batch and the indices still alive, returns the indices to keep
+        self.keep_fn = keep_fn
+        self.seconds = 0.0
+        self.seen = 0
+        self.rejected = 0
+
+    def cost(self) -> float:
+        return self.seconds / max(1, self.seen)
+
+    def rejection_rate(self) -> float:
+        # Laplace smoothing, a filter that never rejected anything yet is not free
+        return (self.rejected + 1) / (self.seen + 2)
+
+    def rank(self) -> float:
+        # Classic ordering for independent filters: cheap and selective first
+        return self.cost() / self.rejection_rate()
+
+
+def passes(predicate: Callable[[object], bool], document) -> bool:
+    # A predicate that raises rejects its document, not the batch
+    try:
+        return bool(predicate(document))
+    except Exception as e:
+        logging.warning(f"Failed to filter document with {getattr(predicate, '__name__', predicate)}: {e}")
+        return False
+
+
+def per_document(predicate: Callable[[object], bool]) -> Callable[[object, List[int]], List[int]]:
+    # The predicate gets the batch's per-document object, shared by every per-document predicate
+    def keep_fn(batch, indices: List[int]) -> List[int]:
+        return [i for i in indices if passes(predicate, batch.documents[i])]
+    return keep_fn
+
+
+class FilterChain:
+    def __init__(self,
+                 predicates: List[Predicate],
+                 adaptive: bool = True,
+                 min_samples: int = 32):
+        self.predicates = list(predicates)
+        self.adaptive = adaptive
+        self.min_samples = min_samples
+
+    def run(self, batch, indices: List[int], stats=None) -> List[int]:
+        for predicate in self.predicates:
+            if not indices:
+                break
+            start = time.perf_counter()
+            kept = predicate.keep_fn(batch, indices)
+            seconds = time.perf_counter() - start
+
+            predicate.seconds += seconds
+            predicate.seen += len(indices)
+            predicate.rejected += len(indices) - len(kept)
+            if stats is not None:
+                stats.seconds[f"filter.{predicate.name}"] += seconds
+                stats.reject(predicate.name, len(indices) - len(kept))
+            indices = kept
+
+        if self.adaptive:
+            self.reorder()
+        return indices
+
+    def reorder(self):
+        # The predicates are independent, so the order changes the cost but never the kept set.
+        # Filters without enough samples go first until their cost and selectivity are known.
+        self.predicates.sort(key=lambda p: p.rank() if p.seen >= self.min_samples else 0.0)
+
+    def order(self) -> List[str]:
+        return [p.name for p in self.predicates]
+
+    def summary(self) -> str:
+        return ", ".join(
+            f"{p.name}: {p.cost() * 1e3:.3f}ms/doc, {p.rejected}/{p.seen} rejected"
+            for p in self.predicates
+        )
@@ -0,0 +1,99 @@
+import os
+import re
+from argparse import Namespace
+from pathlib import Path
+from typing import Iterable
+
+import tldextract
+
+header_filter = None
+
+
+def load_blocklist(path: str | os.PathLike) -> set:
+    blocklist = set()
+    for line in Path(path).read_text(encoding="utf-8").splitlines():
+        line = line.strip().lower()
+        if line and not line.startswith("#"):
+            blocklist.add(line)
+    return blocklist
+
+
+class HeaderFilter:
+    # Decides from the WARC and HTTP headers alone, a rejected record is skipped without reading its payload
+    def __init__(self,
+                 allowed_status: Iterable[int] | None = (200,),
+                 min_bytes: int = 0,
+                 max_bytes: int | None = None,
+                 payload_types: Iterable[str] | None = None,
+                 url_exclude: str | None = None,
+                 domain_blocklist: Iterable[str] | None = None):
+        self.allowed_status = set(allowed_status) if allowed_status else None
+        self.min_bytes = min_bytes
+        self.max_bytes = max_bytes
+        self.payload_types = tuple(payload_types) if payload_types else None
+        self.url_exclude = re.compile(url_exclude) if url_exclude else None
+        self.domain_blocklist = set(domain_blocklist) if domain_blocklist else None
+        # The bundled public suffix snapshot, workers never hit the network
+        self.extract = tldextract.TLDExtract(suffix_list_urls=(), cache_dir=None)
+
+    def reject_reason(self, record) -> str | None:
+        if self.allowed_status is not None and record.is_http:
+            if record.http_headers.status_code not in self.allowed_status:
+                return "header.status"
+
+        if record.content_length < self.min_bytes or \
+                (self.max_bytes is not None and record.content_length > self.max_bytes):
+            return "header.size"
+
+        if self.payload_types is not None:
+            # Only set when the crawler sniffed the payload, absent otherwise
+            payload_type = record.headers.get("WARC-Identified-Payload-Type")
+            if payload_type and not payload_type.startswith(self.payload_types):
+                return "header.payload_type"
+
+        url = record.headers.get("WARC-Target-URI") or ""
+        if self.url_exclude is not None and self.url_exclude.search(url):
+            return "header.url"
+
+        if self.domain_blocklist is not None and self.blocked(url):
+            return "header.domain"
+
+        return None
+
+    def blocked(self, url: str) -> bool:
+        parts = self.extract(url)
+        host = ".".join(p for p in (parts.subdomain, parts.domain, parts.suffix) if p).lower()
+        return host in self.domain_blocklist or parts.top_domain_under_public_suffix.lower() in self.domain_blocklist
+
+
+def build_header_filter(args: Namespace) -> HeaderFilter:
+    return HeaderFilter(
+        allowed_status=args.allowed_status,
+        min_bytes=args.min_record_bytes,
+        max_bytes=int(args.max_record_MB * 1024 * 1024) if args.max_record_MB else None,
+        payload_types=args.payload_types,
+        url_exclude=args.url_exclude,
+        domain_blocklist=load_blocklist(args.domain_blocklist) if args.domain_blocklist else None,
+    )
+
+
+def get_header_filter(args: Namespace) -> HeaderFilter | None:
+    # One filter per process, the blocklist is read once
+    global header_filter
+    if not args.header_filter:
+        return None
+    if header_filter is None:
+        header_filter = build_header_filter(args)
+    return header_filter
+
+
+def skip_reason(record, args: Namespace, seen=None) -> str | None:
+    if not args.use_wet:
+        if record.http_content_type and "text/html" not in record.http_content_type:
+            return "content_type"
+    record_filter = get_header_filter(args)
+    reason = record_filter.reject_reason(record) if record_filter is not None else None
+    if reason is None and seen is not None:
+        # Last, only records that would otherwise be read enter the seen-set
+        reason = seen.duplicate_reason(record)
+    return reason
@@ -0,0 +1,97 @@
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import List, Dict
+from data_filtering.data_pipeline.shards import SHARD_SUFFIX, index_path
+from data_filtering.data_pipeline.stage_1.stats import stats_path
+from data_filtering.data_pipeline.stage_1.seen_set import seen_path
+from data_filtering.data_pipeline.stage_1.score_sidecar import candidates_path, scores_path
+from data_filtering.data_pipeline.utils import atomic_write_text
+
+LEDGER_NAME = "ledger.json"
+
+PENDING = "pending"
+IN_FLIGHT = "in_flight"
+DONE = "done"
+FAILED = "failed"
+
+
+def shard_id(url: str) -> str:
+    return Path(url).stem
+
+
+class ShardLedger:
+    def __init__(self,
+                 path: str | os.PathLike,
+                 urls: List[str],
+                 shards: Dict[str, dict]):
+        self.path = Path(path)
+        self.urls = urls
+        self.shards = shards
+        # main.py calls the mark_* methods from executor threads, one state change and its write at a time
+        self.lock = threading.RLock()
+
+    @classmethod
+    def create(cls, output_dir: str | os.PathLike, urls: List[str]) -> "ShardLedger":
+        shards = {url: {"state": PENDING, "manifest": None} for url in urls}
+        ledger = cls(Path(output_dir) / LEDGER_NAME, urls, shards)
+        ledger.save()
+        return ledger
+
+    @classmethod
+    def load(cls, output_dir: str | os.PathLike) -> "ShardLedger":
+        path = Path(output_dir) / LEDGER_NAME
+        data = json.loads(path.read_text(encoding="utf-8"))
+        return cls(path, data["urls"], data["shards"])
+
+    def save(self):
+        with self.lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write_text(self.path, json.dumps({"urls": self.urls, "shards": self.shards}, indent=1))
+
+    def shard_outputs(self, url: str) -> List[Path]:
+        shard_path = self.path.parent / (shard_id(url) + SHARD_SUFFIX)
+        manifest_path = self.path.parent / (shard_id(url) + ".manifest")
+        return [shard_path, index_path(shard_path), manifest_path, stats_path(manifest_path), seen_path(shard_path),
+                candidates_path(shard_path), index_path(candidates_path(shard_path)), scores_path(shard_path)]
+
+    def cleanup(self, url: str):
+        for path in self.shard_outputs(url):
+            if path.exists():
+                path.unlink()
+
+    def recover(self) -> List[str]:
+        # Shards that were in flight or failed left partial documents behind
+        for url in self.urls:
+            shard = self.shards[url]
+            if shard["state"] in (IN_FLIGHT, FAILED):
+                logging.info(f"Cleaning up unfinished shard {url} ({shard['state']})")
+                self.cleanup(url)
+                shard.update(state=PENDING, manifest=None)
+        self.save()
+        return self.unfinished()
+
+    def unfinished(self) -> List[str]:
+        return [url for url in self.urls if self.shards[url]["state"] != DONE]
+
+    def manifests(self) -> List[str]:
+        return [self.shards[url]["manifest"] for url in self.urls if self.shards[url]["state"] == DONE]
+
+    def mark_in_flight(self, url: str):
+        with self.lock:
+            self.shards[url].update(state=IN_FLIGHT, manifest=None)
+            self.save()
+
+    def mark_done(self, url: str, manifest_path: str | os.PathLike):
+        with self.lock:
+            self.shards[url].update(state=DONE, manifest=str(manifest_path))
+            self.shards[url].pop("error", None)
+            self.save()
+
+    def mark_failed(self, url: str, error: str):
+        self.cleanup(url)
+        with self.lock:
+            self.shards[url].update(state=FAILED, manifest=None, error=error)
+            self.save()
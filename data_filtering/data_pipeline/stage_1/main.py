@@ -1,82 +1,215 @@
 import asyncio
 import concurrent.futures
+import json
 import logging
+import multiprocessing
 import os
+from multiprocessing import forkserver
 import random
+import time
 from pathlib import Path
 from argparse import Namespace
 import aiofiles
 import aiohttp
-from typing import List
+from typing import List, Tuple
 from tqdm import tqdm
 from data_filtering.data_pipeline.stage_1.config import parse_args
-from data_filtering.data_pipeline.stage_1.processing_one_file import filter_one_file, init_models
+from data_filtering.data_pipeline.stage_1.processing_one_file import (filter_one_file, filter_one_pipe, init_models,
+                                                                    init_worker)
+from data_filtering.data_pipeline.stage_1.preload import PRELOAD_ENV
+from data_filtering.data_pipeline.stage_1.streaming import release_pipe_reader, shard_pipe, stream_to_worker
+from data_filtering.data_pipeline.stage_1.downloads import open_download
+from data_filtering.data_pipeline.stage_1.ledger import ShardLedger, LEDGER_NAME, shard_id
+from data_filtering.data_pipeline.stage_1.stats import StatsStream, stats_path, write_run_report
 from data_filtering.utils import setup_logging
-from data_filtering.data_pipeline.utils import list_file_paths
+from data_filtering.data_pipeline.utils import (list_file_paths, list_local_paths, atomic_write_text,
+                                                is_remote, local_path)
+from data_filtering.data_pipeline.shards import SHARD_SUFFIX
+from data_filtering.data_pipeline.stage_1.split_records import RecordSplitter
+from data_filtering.data_pipeline.stage_1.scheduler import ShardScheduler
+from data_filtering.data_pipeline.stage_1.seen_set import BloomFilter, SEEN_NAME, merge_seen, reset_seen_set
+
+
+def start_filter(source: str | Path,
+                 is_pipe: bool,
+                 args: Namespace,
+                 loop,
+                 process_pool,
+                 splitter: RecordSplitter | None,
+                 shard_path: Path) -> asyncio.Future:
+    if splitter is not None:
+        return asyncio.ensure_future(splitter.filter_shard(source, is_pipe, args, loop, shard_path))
+    # Offload the CPU-bound task to the process pool
+    return loop.run_in_executor(
+        process_pool,
+        filter_one_pipe if is_pipe else filter_one_file,
+        source,
+        args,
+        shard_path,
+    )
+
+
+def make_process_pool(args: Namespace) -> Tuple[concurrent.futures.ProcessPoolExecutor, float]:
+    model_paths = (args.lang_model, args.nsfw_model, args.hatespeech_model, args.quality_model)
+    if args.model_preload == "worker":
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=args.num_workers,
+            initializer=init_worker,
+            initargs=(model_paths, False)
+        ), 0.0
+
+    # Load the models once, before any worker forks, so their pages are shared copy-on-write
+    start = time.perf_counter()
+    if args.model_preload == "fork":
+        init_models(*model_paths)
+    else:
+        # The forkserver imports the preload module, which loads the models, then forks every worker
+        os.environ[PRELOAD_ENV] = json.dumps(model_paths)
+        multiprocessing.set_forkserver_preload(["data_filtering.data_pipeline.stage_1.preload"])
+        forkserver.ensure_running()
+    preload_seconds = time.perf_counter() - start
+    logging.info(f"Models preloaded for {args.model_preload} workers in {preload_seconds:.1f}s")
+
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=args.num_workers,
+        mp_context=multiprocessing.get_context(args.model_preload),
+        initializer=init_worker,
+        initargs=(model_paths, True)
+    ), preload_seconds
+
+
+async def spill_and_filter(session: aiohttp.ClientSession,
+                           url: str,
+                           args: Namespace,
+                           loop,
+                           process_pool,
+                           splitter: RecordSplitter | None,
+                           scheduler: ShardScheduler,
+                           shard_path: Path) -> Tuple[List[str], dict]:
+    tmp_path = None
+
+    try:
+        # The network slot is released as soon as the download ends, the shard then waits for a worker
+        async with scheduler.download(), \
+                aiofiles.tempfile.NamedTemporaryFile(suffix=".gz", delete=False) as tmp_file:
+            tmp_path = tmp_file.name
+            async with open_download(session, url, args, scheduler.add_bytes) as download:
+                async for chunk in download.iter_chunked(args.CHUNK_MB * 1024 * 1024):
+                    await tmp_file.write(chunk)
+
+        async with scheduler.cpu():
+            return await start_filter(tmp_path, False, args, loop, process_pool, splitter, shard_path)
+
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+async def stream_and_filter(session: aiohttp.ClientSession,
+                            url: str,
+                            args: Namespace,
+                            loop,
+                            process_pool,
+                            pipe_pool,
+                            splitter: RecordSplitter | None,
+                            scheduler: ShardScheduler,
+                            shard_path: Path) -> Tuple[List[str], dict]:
+    with shard_pipe() as pipe_path:
+        async with open_download(session, url, args, scheduler.add_bytes) as download:
+            # The worker parses while the download is still running
+            worker = start_filter(pipe_path, True, args, loop, process_pool, splitter, shard_path)
+            try:
+                await stream_to_worker(download, pipe_path, worker, args, loop, pipe_pool)
+            except Exception:
+                # A truncated stream still parses, wait for the worker and drop its result.
+                # The pipe may never have been opened, the worker would then block in open() forever.
+                await release_pipe_reader(pipe_path, worker)
+                await asyncio.wait([worker])
+                raise
+
+        return await worker
+
 
 async def process_one_file_async(session: aiohttp.ClientSession,
                                  url: str,
                                  args: Namespace,
                                  loop,
-                                 process_pool):
+                                 process_pool,
+                                 ledger: ShardLedger,
+                                 stats_stream: StatsStream,
+                                 scheduler: ShardScheduler,
+                                 pipe_pool=None,
+                                 splitter: RecordSplitter | None = None,
+                                 seen_bloom: BloomFilter | None = None):
     output_dir = Path(args.STAGE1_DIR)
     output_dir.mkdir(parents=True, exist_ok=True)
-    tmp_path = None
+    shard_path = output_dir / (shard_id(url) + SHARD_SUFFIX)
 
     try:
-        async with aiofiles.tempfile.NamedTemporaryFile(suffix=".gz", delete=False) as tmp_file:
-            tmp_path = tmp_file.name
-            async with session.get(url) as resp:
-                resp.raise_for_status()
-                while True:
-                    chunk = await resp.content.read(args.CHUNK_MB * 1024 * 1024)
-                    if not chunk:
-                        break
-                    await tmp_file.write(chunk)
-
-        # Offload the CPU-bound task to the process pool
-        manifest = await loop.run_in_executor(
-            process_pool,
-            filter_one_file,
-            tmp_path,
-            args,
-            output_dir,
-        )
+        if not is_remote(url):
+            # Pre-staged shard, the worker reads it in place
+            async with scheduler.cpu():
+                await loop.run_in_executor(None, ledger.mark_in_flight, url)
+                manifest, stats = await start_filter(str(local_path(url)), False, args, loop, process_pool,
+                                                     splitter, shard_path)
+        elif args.stream:
+            # Both stages at once: the worker slot first, the pipe would stall the download otherwise
+            async with scheduler.cpu(), scheduler.download():
+                await loop.run_in_executor(None, ledger.mark_in_flight, url)
+                manifest, stats = await stream_and_filter(session, url, args, loop, process_pool, pipe_pool,
+                                                          splitter, scheduler, shard_path)
+        else:
+            # The temp file holds a spill slot from the download until the worker is done with it
+            async with scheduler.spill_slots:
+                await loop.run_in_executor(None, ledger.mark_in_flight, url)
+                manifest, stats = await spill_and_filter(session, url, args, loop, process_pool, splitter,
+                                                         scheduler, shard_path)
 
     except Exception as e:
         logging.error(f"Failed processing {url}: {e}")
+        await loop.run_in_executor(None, ledger.mark_failed, url, repr(e))
         return None
 
-    finally:
-        if tmp_path and os.path.exists(tmp_path):
-            os.unlink(tmp_path)
-
-    manifest_path = output_dir / (Path(url).stem + ".manifest")
-    async with aiofiles.open(manifest_path, "w") as f:
-        await f.write("\n".join(manifest))
+    manifest_path = output_dir / (shard_id(url) + ".manifest")
+    await loop.run_in_executor(None, atomic_write_text, stats_path(manifest_path), json.dumps(stats))
+    await loop.run_in_executor(None, atomic_write_text, manifest_path, "\n".join(manifest))
+    await loop.run_in_executor(None, ledger.mark_done, url, manifest_path)
+    if seen_bloom is not None:
+        # After mark_done: a crash in between only misses duplicates, a re-run shard never finds its own records
+        await loop.run_in_executor(None, merge_seen, seen_bloom, shard_path)
+    stats_stream.write(url, stats)
 
     return manifest_path
 
 
 async def main_orchestrator(urls: List[str],
-                            args: Namespace):
+                            args: Namespace,
+                            ledger: ShardLedger):
     conn = aiohttp.TCPConnector(limit=args.concurrency, limit_per_host=args.concurrency)
-    sem = asyncio.Semaphore(args.max_concurrent_downloads)
-    process_pool = concurrent.futures.ProcessPoolExecutor(
-        max_workers=args.num_workers,
-        initializer=init_models,
-        initargs=(args.lang_model, args.nsfw_model, args.hatespeech_model, args.quality_model)
-    )
+    scheduler = ShardScheduler(args)
+    process_pool, preload_seconds = make_process_pool(args)
+
+    # Blocking pipe writes get their own threads, the default executor also serves DNS lookups
+    pipe_pool = concurrent.futures.ThreadPoolExecutor(
+        max_workers=args.max_concurrent_downloads
+    ) if args.stream else None
+    splitter = RecordSplitter(args, process_pool) if args.split_records else None
+    # Only the parent writes the seen-set, workers map it read-only
+    seen_bloom = BloomFilter.create(Path(args.STAGE1_DIR) / SEEN_NAME,
+                                    args.seen_capacity, args.seen_error_rate) if args.seen_set else None
+
+    stats_stream = StatsStream(args.stats_stream)
+    start_time = time.time()
 
     loop = asyncio.get_running_loop()
-    async def task_with_semaphore(session, url):
-        async with sem:
-            return await process_one_file_async(session, url, args, loop, process_pool)
+    controller = asyncio.create_task(scheduler.control_loop(args.control_interval))
 
     try:
         async with aiohttp.ClientSession(connector=conn) as session:
             tasks = [
-                asyncio.create_task(task_with_semaphore(session, u))
+                asyncio.create_task(process_one_file_async(session, u, args, loop, process_pool, ledger,
+                                                           stats_stream, scheduler, pipe_pool, splitter,
+                                                           seen_bloom))
                 for u in urls
             ]
             manifests = []
@@ -89,11 +222,32 @@ async def main_orchestrator(urls: List[str],
                 manifest_path = await future
                 if manifest_path is not None:
                     manifests.append(manifest_path)
-            logging.info(f"All files processed. Total manifests created: {len(manifests)}")
+            logging.info(f"All files processed. Total manifests created: {len(manifests)}, "
+                         f"unfinished shards: {len(ledger.unfinished())}")
 
     finally:
+        controller.cancel()
         logging.info("Shutting down process pool.")
         process_pool.shutdown()
+        if pipe_pool is not None:
+            pipe_pool.shutdown()
+        if splitter is not None:
+            splitter.shutdown()
+        stats_stream.close()
+
+        # Covers every finished shard in the ledger, including those of previous runs
+        report_path = Path(args.STAGE1_DIR) / "run_report.json"
+        report = write_run_report(report_path,
+                                  ledger.manifests(),
+                                  run_seconds=time.time() - start_time,
+                                  model_preload=args.model_preload,
+                                  preload_seconds=preload_seconds,
+                                  scheduler=scheduler.summary(),
+                                  unfinished_shards=len(ledger.unfinished()))
+        for pid, worker in report["workers"].items():
+            logging.info(f"Worker {pid}: startup {worker.get('startup_seconds') or 0:.2f}s, "
+                         f"RSS {worker.get('rss_MB', 0):.0f}MB, PSS {worker.get('pss_MB', 0):.0f}MB")
+        logging.info(f"Run report written to {report_path}")
 
 if __name__ == "__main__":
     setup_logging()
@@ -103,5 +257,19 @@ if __name__ == "__main__":
     logging.info("Starting Stage 1 pre-processing...")
     logging.info(f"Args: {vars(args)}")
 
-    urls = list_file_paths(args.num_urls, args.use_wet)
-    asyncio.run(main_orchestrator(urls, args))
\ No newline at end of file
+    if (Path(args.STAGE1_DIR) / LEDGER_NAME).exists() and not args.restart:
+        ledger = ShardLedger.load(args.STAGE1_DIR)
+        urls = ledger.recover()
+        logging.info(f"Resuming from ledger, {len(urls)}/{len(ledger.urls)} shards left")
+    else:
+        if args.input:
+            sampled_urls = list_local_paths(args.input, args.num_urls, args.use_wet,
+                                            args.seed, args.shard_index, args.num_shards)
+        else:
+            sampled_urls = list_file_paths(args.num_urls, args.use_wet, args.base_url, args.crawl_id,
+                                           args.seed, args.shard_index, args.num_shards, args.paths_cache)
+        ledger = ShardLedger.create(args.STAGE1_DIR, sampled_urls)
+        reset_seen_set(args.STAGE1_DIR)
+        urls = ledger.unfinished()
+
+    asyncio.run(main_orchestrator(urls, args, ledger))
\ No newline at end of file
@@ -0,0 +1,10 @@
+import json
+import os
+
+from data_filtering.data_pipeline.stage_1.processing_one_file import init_models
+
+# Imported by the forkserver process (--model_preload forkserver), every worker forks from it
+PRELOAD_ENV = "STAGE1_PRELOAD_MODELS"
+
+if os.environ.get(PRELOAD_ENV):
+    init_models(*json.loads(os.environ[PRELOAD_ENV]))
@@ -1,27 +1,53 @@
 import logging
-import uuid
+import os
+import time
 from pathlib import Path
 
 import fasttext
+import numpy as np
 from fastwarc.warc import ArchiveIterator, WarcRecordType
 from fastwarc import GZipStream, FileStream
 from argparse import Namespace
-from typing import List
+from typing import List, Tuple
 
 from resiliparse.parse.encoding import bytes_to_str
 
 from data_filtering.filtering_utilities.filter_lines import filter_lines
-from data_filtering.filtering_utilities.harmful_content import classify_harmful_content
-from data_filtering.filtering_utilities.mask_pii import mask_pii
-from data_filtering.filtering_utilities.extract_text import extract_text
-from data_filtering.filtering_utilities.language_identification import language_identification
+from data_filtering.filtering_utilities.harmful_content import classify_harmful_content_batch
+from data_filtering.filtering_utilities.fasttext_batch import clean_texts, predict_batch
+from data_filtering.filtering_utilities.language_identification import language_identification_prefix_batch
+from data_filtering.filtering_utilities.mask_pii import mask_pii_batch
 from data_filtering.filtering_utilities.normalizing_text import normalize_whitespace
-from data_filtering.filtering_utilities.super_quality_filter import super_quality_filter
+from data_filtering.filtering_utilities.document_features import DocumentFeatures
+from data_filtering.filtering_utilities.gopher_quality_filters import gopher_quality_filters
+from data_filtering.filtering_utilities.super_quality_filter import (word_statistics_ok, no_html_noise,
+                                                                     punctuation_ratio_ok, domain_coherence_ok)
+from data_filtering.data_pipeline.stage_1.filter_chain import FilterChain, Predicate, passes, per_document
+from data_filtering.data_pipeline.stage_1.streaming import PipeReader
+from data_filtering.data_pipeline.stage_1.header_filter import skip_reason
+from data_filtering.data_pipeline.stage_1.extraction_guard import get_extraction_guard
+from data_filtering.data_pipeline.stage_1.seen_set import open_seen_set, seen_path
+from data_filtering.data_pipeline.stage_1.record_batches import unpack_records
+from data_filtering.data_pipeline.stage_1.score_sidecar import (HEURISTIC_PREFIX, ScoreSidecar, decision_steps,
+                                                                feature_columns)
+from data_filtering.data_pipeline.shards import ShardWriter
+from data_filtering.data_pipeline.stage_1.stats import ShardStats, process_memory
 
 lang_m: fasttext.FastText = None
 nsfw_m: fasttext.FastText = None
 hate_m: fasttext.FastText = None
 quality_m: fasttext.FastText = None
+filter_chain: FilterChain = None
+worker_info: dict = {}
+
+# Per-document heuristics on the extracted text, in declaration order
+HEURISTICS = [
+    ("gopher", gopher_quality_filters),
+    ("word_statistics", word_statistics_ok),
+    ("html_noise", no_html_noise),
+    ("punctuation_ratio", punctuation_ratio_ok),
+    ("domain_coherence", domain_coherence_ok),
+]
 
 
 def init_models(lang_path: str | Path,
@@ -43,73 +69,319 @@ def init_models(lang_path: str | Path,
     # hate_m = fasttext.load_model(hate_path)
     quality_m = fasttext.load_model(quality_path)
 
+
+def init_worker(model_paths: Tuple[str, ...],
+                preloaded: bool):
+    # With --model_preload fork/forkserver the models were loaded before the fork and their pages
+    # are shared copy-on-write, otherwise every worker loads its own copy
+    start = time.perf_counter()
+    if preloaded and lang_m is not None:
+        logging.basicConfig(
+            level=logging.INFO,
+            format="%(asctime)s [%(process)d] %(levelname)s %(message)s",
+            handlers=[logging.StreamHandler()]
+        )
+    else:
+        if preloaded:
+            logging.warning("Preloaded models not found in the worker, loading them again")
+        init_models(*model_paths)
+    worker_info.update(pid=os.getpid(), startup_seconds=time.perf_counter() - start)
+
+
+def add_worker_stats(stats: ShardStats):
+    stats.add_worker(os.getpid(), startup_seconds=worker_info.get("startup_seconds"), **process_memory())
+
 def filter_one_file(compressed_file_path: str,
                     args: Namespace,
-                    output_dir: Path) -> List[str]:
-    manifest = []
-    total_records = 0
-    kept_records = 0
+                    shard_path: Path) -> Tuple[List[str], dict]:
     stream = GZipStream(FileStream(str(compressed_file_path), "rb"))
-    record_type = WarcRecordType.response if not args.use_wet else WarcRecordType.conversion
+    return filter_one_stream(stream, args, shard_path)
 
-    for record in ArchiveIterator(stream, record_types=record_type):
-            total_records += 1
 
-            if not args.use_wet:
-                if record.http_content_type and "text/html" not in record.http_content_type:
-                    continue
+def filter_one_pipe(pipe_path: str | Path,
+                    args: Namespace,
+                    shard_path: Path) -> Tuple[List[str], dict]:
+    with open(pipe_path, "rb", buffering=0) as pipe:
+        stream = GZipStream(PipeReader(pipe))
+        return filter_one_stream(stream, args, shard_path)
 
-            try:
-                record_bytes = record.reader.read()
 
-                if not args.use_wet:
-                    extracted_text = extract_text(record_bytes)
-                else:
-                    extracted_text= bytes_to_str(record_bytes)
+class DocumentBatch:
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        # Newline cleaning is shared by the language and NSFW models
+        self.cleaned_texts = clean_texts(texts)
+        # Tokens and counts are shared by the heuristics
+        self.documents = [DocumentFeatures(text) for text in texts]
+
+
+def label_predicate(name: str,
+                    model: fasttext.FastText,
+                    label: str,
+                    threshold: float) -> Predicate:
+    def keep_fn(batch: DocumentBatch, indices: List[int]) -> List[int]:
+        labels, scores = predict_batch([batch.cleaned_texts[i] for i in indices], model)
+        return [i for i, predicted, score in zip(indices, labels, scores)
+                if predicted == label and score >= threshold]
+    return Predicate(name, keep_fn)
+
+
+def identify_language(cleaned_texts: List[str], args: Namespace) -> Tuple[np.ndarray, np.ndarray]:
+    labels, scores, _ = language_identification_prefix_batch(cleaned_texts,
+                                                             lang_m,
+                                                             args.lang,
+                                                             args.confidence,
+                                                             args.lang_prefix_chars,
+                                                             args.lang_prefix_margin,
+                                                             cleaned=True)
+    return labels, scores
+
+
+def prefix_language_predicate(args: Namespace) -> Predicate:
+    def keep_fn(batch: DocumentBatch, indices: List[int]) -> List[int]:
+        labels, scores = identify_language([batch.cleaned_texts[i] for i in indices], args)
+        return [i for i, predicted, score in zip(indices, labels, scores)
+                if predicted == args.lang and score >= args.confidence]
+    return Predicate("language", keep_fn)
+
+
+def build_filter_chain(args: Namespace) -> FilterChain:
+    # Independent predicates on the extracted text, the chain may reorder them
+    predicates = [
+        prefix_language_predicate(args) if args.lang_prefix_chars
+        else label_predicate("language", lang_m, args.lang, args.confidence),
+        *[Predicate(name, per_document(heuristic)) for name, heuristic in HEURISTICS],
+        label_predicate("nsfw", nsfw_m, "non-nsfw", args.nsfw_threshold),
+        # label_predicate("hate", hate_m, "non-toxic", args.hate_threshold),
+    ]
+    return FilterChain(predicates, adaptive=not args.fixed_filter_order)
+
+
+def get_filter_chain(args: Namespace) -> FilterChain:
+    # One chain per worker, built once the models are loaded.
+    # Its measurements carry over from one shard to the next.
+    global filter_chain
+    if filter_chain is None:
+        filter_chain = build_filter_chain(args)
+    return filter_chain
+
+
+def filter_batch(texts: List[str],
+                 args: Namespace,
+                 stats: ShardStats,
+                 sidecar: ScoreSidecar | None = None) -> List[str]:
+    if sidecar is not None:
+        return score_batch(texts, args, stats, sidecar)
+
+    batch = DocumentBatch(texts)
+    keep = get_filter_chain(args).run(batch, list(range(len(texts))), stats)
+
+    # The quality model scores the line-filtered text, it always runs last
+    with stats.timer("filter_lines"):
+        filtered_texts = [filter_lines(texts[i], args.min_words) for i in keep]
+    with stats.timer("filter.quality"):
+        labels_quality, scores_quality = classify_harmful_content_batch(filtered_texts, quality_m)
 
-                if not extracted_text.strip():
-                    continue
+    good_texts = []
+    for filtered_text, label_quality, score_quality in zip(filtered_texts, labels_quality, scores_quality):
+        if not (label_quality == "good" and score_quality >= args.quality_threshold):
+            stats.reject("quality")
+            continue
+        good_texts.append(filtered_text)
 
-                # Language check
-                lang, confidence = language_identification(extracted_text, lang_m)
-                if lang != args.lang or confidence < args.confidence:
-                    continue
+    # PII masking
+    with stats.timer("pii"):
+        masked_texts, _ = mask_pii_batch(good_texts)
+        normalized_texts = [normalize_whitespace(text) for text in masked_texts]
 
-                if not super_quality_filter(extracted_text):
-                    continue
+    kept_texts = []
+    for normalized_text in normalized_texts:
+        if normalized_text:
+            kept_texts.append(normalized_text)
+        else:
+            stats.reject("empty_after_filtering")
 
-                # Harmful content
-                label_nsfw, score_nsfw = classify_harmful_content(extracted_text, nsfw_m)
-                if not (label_nsfw == "non-nsfw" and score_nsfw >= args.nsfw_threshold):
-                    continue
+    return kept_texts
 
-                # label_hate, score_hate = classify_harmful_content(extracted_text, hate_m)
-                # if not (label_hate == "non-toxic" and score_hate >= args.hate_threshold):
-                #     continue
 
-                filtered_text = filter_lines(extracted_text, args.min_words)
-                label_quality, score_quality = classify_harmful_content(filtered_text, quality_m)
+def score_batch(texts: List[str],
+                args: Namespace,
+                stats: ShardStats,
+                sidecar: ScoreSidecar) -> List[str]:
+    # --score_sidecar: every model and heuristic runs on every document, no short-circuit,
+    # so the decision can be replayed later from the stored scores at other thresholds
+    batch = DocumentBatch(texts)
+    with stats.timer("score.language"):
+        if args.lang_prefix_chars:
+            lang_labels, lang_scores = identify_language(batch.cleaned_texts, args)
+        else:
+            lang_labels, lang_scores = predict_batch(batch.cleaned_texts, lang_m)
+    columns = {"lang": lang_labels, "lang_score": lang_scores}
 
-                if not (label_quality == "good" and score_quality >= args.quality_threshold):
-                    continue
+    with stats.timer("score.features"):
+        columns.update(feature_columns(batch.documents))
+    for name, heuristic in HEURISTICS:
+        with stats.timer(f"score.{name}"):
+            columns[HEURISTIC_PREFIX + name] = np.array([passes(heuristic, doc) for doc in batch.documents],
+                                                        dtype=bool)
 
+    with stats.timer("score.nsfw"):
+        columns["nsfw_label"], columns["nsfw_score"] = predict_batch(batch.cleaned_texts, nsfw_m)
 
-                # PII masking
-                masked_extracted_text, _ = mask_pii(filtered_text)
-                normalized_text = normalize_whitespace(masked_extracted_text)
-                kept_records += 1
+    with stats.timer("filter_lines"):
+        filtered_texts = [filter_lines(text, args.min_words) for text in texts]
+    with stats.timer("score.quality"):
+        columns["quality_label"], columns["quality_score"] = classify_harmful_content_batch(filtered_texts, quality_m)
 
-                if not normalized_text:
-                    continue
+    with stats.timer("pii"):
+        masked_texts, _ = mask_pii_batch(filtered_texts)
+        final_texts = [normalize_whitespace(text) for text in masked_texts]
+    columns["extracted_chars"] = np.array([len(text) for text in texts], dtype=np.int32)
+    columns["final_bytes"] = np.array([len(text.encode("utf-8")) for text in final_texts], dtype=np.int32)
 
-                uid = uuid.uuid4().hex
-                doc_path = output_dir / f"{uid}.txt"
+    with stats.timer("write"):
+        sidecar.add(final_texts, columns)
 
-                doc_path.write_text(normalized_text, encoding="utf-8")
-                manifest.append(str(f"{doc_path}"))
+    # A rejected document is counted under the first step it fails
+    keep = np.ones(len(texts), dtype=bool)
+    for reason, passed in decision_steps(columns, args.lang, args.confidence,
+                                         args.nsfw_threshold, args.quality_threshold):
+        rejected = int(np.count_nonzero(keep & ~passed))
+        if rejected:
+            stats.reject(reason, rejected)
+        keep &= passed
+    return [text for text, kept in zip(final_texts, keep) if kept]
+
+
+def record_text(record_bytes: bytes,
+                args: Namespace,
+                stats: ShardStats,
+                charset: str | None = None) -> str | None:
+    guard = get_extraction_guard(args)
+    reason = guard.reject_reason(record_bytes, is_html=not args.use_wet)
+    if reason is not None:
+        stats.reject(reason)
+        return None
+
+    start = time.perf_counter()
+    with stats.timer("extract"):
+        if not args.use_wet:
+            extracted_text = guard.extract(record_bytes, charset, stats.counts)
+        else:
+            extracted_text= bytes_to_str(record_bytes)
+    stats.add_extract_time(time.perf_counter() - start)
+
+    if extracted_text is None:
+        stats.reject("extract.timeout")
+        return None
+    if not extracted_text.strip():
+        stats.reject("empty")
+        return None
+    return extracted_text
+
+
+def filter_one_stream(stream,
+                      args: Namespace,
+                      shard_path: Path) -> Tuple[List[str], dict]:
+    stats = ShardStats()
+    batch = []
+    record_type = WarcRecordType.response if not args.use_wet else WarcRecordType.conversion
+    seen = open_seen_set(args)
+    sidecar = ScoreSidecar(shard_path, [name for name, _ in HEURISTICS]) if args.score_sidecar else None
+
+    def flush_batch():
+        try:
+            kept_texts = filter_batch(batch, args, stats, sidecar)
+        except Exception as e:
+            logging.warning(f"Failed to process batch of {len(batch)} records: {e}")
+            stats.reject("batch_error", len(batch))
+            kept_texts = []
+        with stats.timer("write"):
+            for text in kept_texts:
+                writer.write(text)
+                stats.add_output(text)
+        batch.clear()
+
+    # All kept documents of the input shard go into one packed output shard
+    with stats.timer("total"), ShardWriter(shard_path) as writer:
+        for record in ArchiveIterator(stream, record_types=record_type):
+            stats.counts["records"] += 1
+
+            reason = skip_reason(record, args, seen)
+            if reason is not None:
+                # The iterator skips the unread payload
+                stats.reject(reason)
+                stats.counts["skipped_bytes"] += record.content_length
+                continue
+
+            try:
+                with stats.timer("read"):
+                    record_bytes = record.reader.read()
+                stats.add_record(len(record_bytes))
+
+                extracted_text = record_text(record_bytes, args, stats, record.http_charset)
+                if extracted_text is not None:
+                    batch.append(extracted_text)
 
             except Exception as e:
-                logging.warning(f"Failed to process record #{total_records}: {e}")
+                logging.warning(f"Failed to process record #{stats.counts['records']}: {e}")
+                stats.reject("record_error")
+
+            # Micro-batches amortize the per-call overhead of the fastText models
+            if len(batch) >= args.batch_size:
+                flush_batch()
+
+        if batch:
+            flush_batch()
+
+    if sidecar is not None:
+        sidecar.close()
+    if seen is not None:
+        seen.save(seen_path(shard_path))
 
+    add_worker_stats(stats)
+    total_records, kept_records = stats.counts["records"], stats.counts["kept"]
     logging.info(f"Finished one file. Processed: {total_records}, Kept: {kept_records} ({kept_records / total_records if total_records != 0 else 1:.2%})")
-    return manifest
+    if sidecar is None:
+        logging.info(f"Filter chain: {get_filter_chain(args).summary()}")
+    return [str(shard_path)], stats.to_dict()
+
+
+def filter_record_batch(shm_name: str,
+                        offsets: List[int],
+                        charsets: List[str | None],
+                        args: Namespace) -> Tuple[List[str], dict]:
+    # Worker side of --split_records: the reader already split the shard into raw payloads
+    stats = ShardStats()
+    texts = []
+    for i, (record_bytes, charset) in enumerate(zip(unpack_records(shm_name, offsets), charsets)):
+        try:
+            extracted_text = record_text(record_bytes, args, stats, charset)
+            if extracted_text is not None:
+                texts.append(extracted_text)
+        except Exception as e:
+            logging.warning(f"Failed to process record #{i} of batch {shm_name}: {e}")
+            stats.reject("record_error")
+
+    kept_texts = []
+    for start in range(0, len(texts), args.batch_size):
+        batch = texts[start:start + args.batch_size]
+        try:
+            kept_texts.extend(filter_batch(batch, args, stats))
+        except Exception as e:
+            logging.warning(f"Failed to process batch of {len(batch)} records: {e}")
+            stats.reject("batch_error", len(batch))
+    add_worker_stats(stats)
+    return kept_texts, stats.to_dict()
+
+
+def write_shard(shard_path: Path,
+                kept_batches: List[List[str]]) -> dict:
+    # Reassembles the kept documents of a split shard in record order
+    stats = ShardStats()
+    with stats.timer("write"), ShardWriter(shard_path) as writer:
+        for kept_texts in kept_batches:
+            for text in kept_texts:
+                writer.write(text)
+                stats.add_output(text)
+    return stats.to_dict()
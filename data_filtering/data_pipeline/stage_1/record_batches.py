@@ -0,0 +1,106 @@
+import logging
+from argparse import Namespace
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from pathlib import Path
+from typing import List, Tuple
+
+from fastwarc import GZipStream, FileStream
+from fastwarc.warc import ArchiveIterator, WarcRecordType
+
+from data_filtering.data_pipeline.stage_1.stats import ShardStats
+from data_filtering.data_pipeline.stage_1.streaming import PipeReader
+from data_filtering.data_pipeline.stage_1.header_filter import skip_reason
+from data_filtering.data_pipeline.stage_1.seen_set import open_seen_set, seen_path
+
+# Queue sentinel sent by the reader once the shard is exhausted
+END_OF_SHARD = None
+
+
+def pack_records(payloads: List[bytes]) -> Tuple[str, List[int]]:
+    # One shared block per batch, only its name and the record offsets travel through the queue
+    offsets = [0]
+    for payload in payloads:
+        offsets.append(offsets[-1] + len(payload))
+
+    shm = SharedMemory(create=True, size=max(1, offsets[-1]))
+    for payload, start, end in zip(payloads, offsets, offsets[1:]):
+        shm.buf[start:end] = payload
+    shm.close()
+    # Ownership moves to the worker that unlinks it, the reader's tracker must not reclaim it
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm.name, offsets
+
+
+def unpack_records(shm_name: str, offsets: List[int]) -> List[bytes]:
+    shm = SharedMemory(name=shm_name)
+    try:
+        return [bytes(shm.buf[start:end]) for start, end in zip(offsets, offsets[1:])]
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def release_records(shm_name: str):
+    # For batches that never reached a worker
+    try:
+        unpack_records(shm_name, [])
+    except FileNotFoundError:
+        pass
+
+
+def read_record_batches(source: str | Path,
+                        is_pipe: bool,
+                        args: Namespace,
+                        queue,
+                        shard_path: Path) -> dict:
+    # Runs in a reader process: decompresses the shard and splits it into batches of raw
+    # payloads for the worker pool. Extraction and filtering happen in the workers.
+    stats = ShardStats()
+    record_type = WarcRecordType.response if not args.use_wet else WarcRecordType.conversion
+    seen = open_seen_set(args)
+    payloads, charsets = [], []
+
+    def send_batch():
+        # The HTTP charsets are small enough to travel with the batch, the worker decodes with them
+        with stats.timer("pack"):
+            queue.put((*pack_records(payloads), list(charsets)))
+        payloads.clear()
+        charsets.clear()
+
+    pipe = open(source, "rb", buffering=0) if is_pipe else None
+    try:
+        stream = GZipStream(PipeReader(pipe)) if is_pipe else GZipStream(FileStream(str(source), "rb"))
+        for record in ArchiveIterator(stream, record_types=record_type):
+            stats.counts["records"] += 1
+
+            reason = skip_reason(record, args, seen)
+            if reason is not None:
+                # The iterator skips the unread payload
+                stats.reject(reason)
+                stats.counts["skipped_bytes"] += record.content_length
+                continue
+
+            try:
+                with stats.timer("read"):
+                    record_bytes = record.reader.read()
+                stats.add_record(len(record_bytes))
+                payloads.append(record_bytes)
+                charsets.append(record.http_charset)
+            except Exception as e:
+                logging.warning(f"Failed to read record #{stats.counts['records']}: {e}")
+                stats.reject("record_error")
+
+            if len(payloads) >= args.records_per_task:
+                send_batch()
+
+        if payloads:
+            send_batch()
+        if seen is not None:
+            seen.save(seen_path(shard_path))
+    finally:
+        if pipe is not None:
+            pipe.close()
+        queue.put(END_OF_SHARD)
+
+    return stats.to_dict()
@@ -0,0 +1,177 @@
+import argparse
+import glob
+import json
+import logging
+import os
+from functools import partial
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from data_filtering.utils import setup_logging
+from data_filtering.data_pipeline.shards import SHARD_SUFFIX, ShardWriter
+from data_filtering.data_pipeline.utils import atomic_write_text
+from data_filtering.data_pipeline.stage_1.processing_one_file import HEURISTICS
+from data_filtering.data_pipeline.stage_1.score_sidecar import (HEURISTIC_PREFIX, SCORES_SUFFIX, candidates_path,
+                                                                heuristic_names, keep_mask, load_scores,
+                                                                replay_heuristic)
+from data_filtering.filtering_utilities.document_features import FEATURES
+
+# Cutoff flags of each heuristic, by keyword argument of the heuristic. Unset flags keep its default.
+HEURISTIC_FLAGS = {
+    "gopher": {
+        "min_words": "gopher_min_words",
+        "max_words": "gopher_max_words",
+        "min_mean_word_length": "gopher_min_mean_word_length",
+        "max_mean_word_length": "gopher_max_mean_word_length",
+        "min_alpha_ratio": "gopher_min_alpha_ratio",
+        "max_symbol_ratio": "gopher_max_symbol_ratio",
+        "min_stop_words": "gopher_min_stop_words",
+        "max_ellipsis_ratio": "gopher_max_ellipsis_ratio",
+    },
+    "word_statistics": {"min_diversity": "min_lexical_diversity", "max_numeric_ratio": "max_numeric_ratio"},
+    "html_noise": {"max_ratio": "max_html_noise_ratio"},
+    "punctuation_ratio": {"max_ratio": "max_punctuation_ratio"},
+    "domain_coherence": {"min_hits": "min_domain_keywords"},
+}
+
+
+def parse_args(argv: List[str] | None = None):
+    parser = argparse.ArgumentParser(description="Re-apply the Stage 1 thresholds to the scores of a --score_sidecar run")
+
+    parser.add_argument("--STAGE1_DIR", required=True, type=str,
+                        help="Output of a Stage 1 run with --score_sidecar.")
+    parser.add_argument("--output_dir", required=True, type=str,
+                        help="Receives the kept shards and their manifests, usable as STAGE1_DIR of Stage 2.")
+
+    parser.add_argument("--lang", default="en", type=str,
+                        help="Language to keep.")
+    parser.add_argument("--confidence", default=0.90, type=float,
+                        help="Min language score.")
+    parser.add_argument("--nsfw_threshold", default=0.95, type=float,
+                        help="Min non-nsfw score.")
+    parser.add_argument("--quality_threshold", default=0.8, type=float,
+                        help="Min quality score.")
+    parser.add_argument("--heuristics", nargs="*", default=None,
+                        help="Heuristics a document must pass, all of them by default.")
+
+    # Heuristic cutoffs, replayed from the stored document features. Unset: the Stage 1 value.
+    parser.add_argument("--gopher_min_words", default=None, type=int)
+    parser.add_argument("--gopher_max_words", default=None, type=int)
+    parser.add_argument("--gopher_min_mean_word_length", default=None, type=float)
+    parser.add_argument("--gopher_max_mean_word_length", default=None, type=float)
+    parser.add_argument("--gopher_min_alpha_ratio", default=None, type=float,
+                        help="Min share of words with an alphabetic character.")
+    parser.add_argument("--gopher_max_symbol_ratio", default=None, type=float,
+                        help="Max share of '#' and '...' words.")
+    parser.add_argument("--gopher_min_stop_words", default=None, type=int)
+    parser.add_argument("--gopher_max_ellipsis_ratio", default=None, type=float,
+                        help="Max share of lines ending with '...'.")
+    parser.add_argument("--min_lexical_diversity", default=None, type=float,
+                        help="Min unique / total words, word_statistics heuristic.")
+    parser.add_argument("--max_numeric_ratio", default=None, type=float,
+                        help="Max share of words with a digit, word_statistics heuristic.")
+    parser.add_argument("--max_html_noise_ratio", default=None, type=float,
+                        help="Max share of tokens holding an HTML tag or a URL.")
+    parser.add_argument("--max_punctuation_ratio", default=None, type=float,
+                        help="Max share of punctuation characters.")
+    parser.add_argument("--min_domain_keywords", default=None, type=int,
+                        help="Min domain keyword hits.")
+
+    return parser.parse_args(argv)
+
+
+def all_heuristic_names(scores_files: List[str]) -> List[str]:
+    # Union over the shards, in column order: shards may have been scored with different heuristics
+    names = {}
+    for scores_file in scores_files:
+        with np.load(scores_file) as npz:
+            names.update(dict.fromkeys(heuristic_names(npz.files)))
+    return list(names)
+
+
+def build_heuristics(args: argparse.Namespace) -> Dict[str, Callable]:
+    # Each selected heuristic with the cutoffs given on the command line
+    functions = dict(HEURISTICS)
+    unknown = [name for name in args.heuristics if name not in functions]
+    if unknown:
+        raise SystemExit(f"Unknown heuristics {unknown}, expected some of {list(functions)}")
+    return {name: partial(functions[name], **{keyword: getattr(args, flag)
+                                              for keyword, flag in HEURISTIC_FLAGS.get(name, {}).items()
+                                              if getattr(args, flag) is not None})
+            for name in args.heuristics}
+
+
+def check_columns(scores_files: List[str], heuristics: Dict[str, Callable]):
+    # Before any output is written: the heuristics are replayed from the features, every shard needs them
+    if not heuristics:
+        return
+    for scores_file in scores_files:
+        with np.load(scores_file) as npz:
+            missing = [name for name in FEATURES if name not in npz.files]
+        if missing:
+            raise SystemExit(f"{scores_file} lacks the feature columns {missing}, it was written by an older "
+                             f"Stage 1 run: rerun that shard with --score_sidecar, or pass --heuristics alone")
+
+
+def rethreshold_shard(scores_file: str | os.PathLike,
+                      output_dir: str | os.PathLike,
+                      args: argparse.Namespace,
+                      heuristics: Dict[str, Callable]) -> dict:
+    scores_file = Path(scores_file)
+    shard_name = scores_file.name[:-len(SCORES_SUFFIX)] + SHARD_SUFFIX
+    scores = load_scores(scores_file)
+    for name, heuristic in heuristics.items():
+        scores[HEURISTIC_PREFIX + name] = replay_heuristic(scores, heuristic)
+    keep = keep_mask(scores, args.lang, args.confidence, args.nsfw_threshold, args.quality_threshold,
+                     list(heuristics))
+
+    # Kept documents are copied as their compressed members, in candidate order, with their ids
+    shard_path = Path(output_dir) / shard_name
+    with open(candidates_path(scores_file.with_name(shard_name)), "rb") as candidates, \
+            ShardWriter(shard_path) as writer:
+        for row in np.flatnonzero(keep):
+            candidates.seek(int(scores["doc_offset"][row]))
+            writer.write_member(str(scores["doc_id"][row]), candidates.read(int(scores["doc_length"][row])))
+
+    manifest_path = shard_path.with_name(shard_name[:-len(SHARD_SUFFIX)] + ".manifest")
+    atomic_write_text(manifest_path, str(shard_path))
+    return {"candidates": len(keep), "kept": int(np.count_nonzero(keep)),
+            "kept_bytes": int(scores["final_bytes"][keep].sum())}
+
+
+def rethreshold(args: argparse.Namespace) -> dict:
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    scores_files = sorted(glob.glob(f"{args.STAGE1_DIR}/*{SCORES_SUFFIX}"))
+    if not scores_files:
+        raise SystemExit(f"No {SCORES_SUFFIX} files in {args.STAGE1_DIR}, was Stage 1 run with --score_sidecar?")
+    if args.heuristics is None:
+        args.heuristics = all_heuristic_names(scores_files)
+    heuristics = build_heuristics(args)
+    check_columns(scores_files, heuristics)
+
+    totals = {"shards": 0, "candidates": 0, "kept": 0, "kept_bytes": 0}
+    for scores_file in scores_files:
+        counts = rethreshold_shard(scores_file, output_dir, args, heuristics)
+        totals["shards"] += 1
+        for key, value in counts.items():
+            totals[key] += value
+
+    logging.info(f"Kept {totals['kept']}/{totals['candidates']} documents "
+                 f"({totals['kept'] / max(1, totals['candidates']):.2%}) of {totals['shards']} shards")
+    cutoffs = {flag: getattr(args, flag) for flags in HEURISTIC_FLAGS.values() for flag in flags.values()
+               if getattr(args, flag) is not None}
+    atomic_write_text(output_dir / "rethreshold_report.json",
+                      json.dumps({"thresholds": {**{key: getattr(args, key) for key in
+                                                    ("lang", "confidence", "nsfw_threshold", "quality_threshold",
+                                                     "heuristics")}, **cutoffs},
+                                  **totals}, indent=1))
+    return totals
+
+
+if __name__ == "__main__":
+    setup_logging()
+    rethreshold(parse_args())
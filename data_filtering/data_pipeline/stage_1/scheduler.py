@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import time
+from argparse import Namespace
+from contextlib import asynccontextmanager
+from typing import List
+
+
+class AdaptiveLimiter:
+    # A semaphore whose limit can change while tasks hold it
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._cond = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+
+    async def __aexit__(self, *exc):
+        async with self._cond:
+            self.active -= 1
+            self._cond.notify_all()
+
+    async def set_limit(self, limit: int):
+        async with self._cond:
+            self.limit = limit
+            self._cond.notify_all()
+
+
+class TimeAverage:
+    # Time-weighted average of a gauge, e.g. the number of busy workers
+    def __init__(self):
+        self.value = 0
+        self._area = 0.0
+        self._last = time.perf_counter()
+        self._start = self._last
+
+    def add(self, delta: int):
+        now = time.perf_counter()
+        self._area += self.value * (now - self._last)
+        self._last = now
+        self.value += delta
+
+    def reset(self) -> float:
+        # Average since the previous reset
+        self.add(0)
+        average = self._area / max(1e-9, self._last - self._start)
+        self._area, self._start = 0.0, self._last
+        return average
+
+
+class ShardScheduler:
+    # Two stages instead of one slot per shard lifetime: downloads run under an adaptive limit,
+    # downloaded shards wait for one of num_workers CPU slots. Spilled temp files stay bounded by
+    # max_concurrent_downloads. A controller moves the download limit from the measured queue
+    # depth, bandwidth and worker utilization.
+    def __init__(self, args: Namespace):
+        self.num_workers = args.num_workers
+        self.max_downloads = args.max_concurrent_downloads
+        self.adaptive = not args.fixed_download_concurrency
+        # --stream tasks take their worker slot before their download slot: a queue for CPU is
+        # shards not downloaded yet, not a backlog of downloaded ones
+        self.stream = args.stream
+        initial = max(1, self.max_downloads // 2) if self.adaptive and not self.stream else self.max_downloads
+
+        self.downloads = AdaptiveLimiter(initial)
+        self.spill_slots = asyncio.Semaphore(args.max_concurrent_downloads)
+        self.cpu_slots = asyncio.Semaphore(args.num_workers)
+
+        self.downloading = TimeAverage()
+        self.waiting = TimeAverage()
+        self.busy = TimeAverage()
+        self.bytes_downloaded = 0
+        self.history: List[dict] = []
+        self._last_bytes = 0
+        self._last_time = time.perf_counter()
+        self._last_bandwidth = 0.0
+        self._last_action = None
+
+    @asynccontextmanager
+    async def download(self):
+        async with self.downloads:
+            self.downloading.add(1)
+            try:
+                yield
+            finally:
+                self.downloading.add(-1)
+
+    @asynccontextmanager
+    async def cpu(self):
+        self.waiting.add(1)
+        try:
+            await self.cpu_slots.acquire()
+        finally:
+            self.waiting.add(-1)
+        self.busy.add(1)
+        try:
+            yield
+        finally:
+            self.busy.add(-1)
+            self.cpu_slots.release()
+
+    def add_bytes(self, num_bytes: int):
+        self.bytes_downloaded += num_bytes
+
+    def sample(self) -> dict:
+        now = time.perf_counter()
+        bandwidth = (self.bytes_downloaded - self._last_bytes) / max(1e-9, now - self._last_time)
+        self._last_bytes, self._last_time = self.bytes_downloaded, now
+        return {
+            "time": time.time(),
+            "download_limit": self.downloads.limit,
+            "downloading": self.downloading.reset(),
+            "waiting_for_cpu": self.waiting.reset(),
+            "worker_utilization": self.busy.reset() / self.num_workers,
+            "bandwidth_MBps": bandwidth / 2 ** 20,
+        }
+
+    def next_limit(self, metrics: dict) -> int:
+        limit = self.downloads.limit
+        if self.stream:
+            # Lowering the limit would leave workers holding a slot with nothing to parse
+            self._last_action = None
+            return limit
+
+        if metrics["waiting_for_cpu"] >= 1 and metrics["worker_utilization"] >= 0.9:
+            # Downloads are ahead of the workers, the extra streams only fill the disk
+            self._last_action = "down"
+            return max(1, limit - 1)
+
+        if metrics["waiting_for_cpu"] < 1 and metrics["worker_utilization"] < 0.9 \
+                and metrics["downloading"] >= limit - 0.5:
+            # Workers starve while every download slot is used: probe one more stream,
+            # and step back if the previous probe did not raise the bandwidth
+            if self._last_action == "up" and metrics["bandwidth_MBps"] < 1.05 * self._last_bandwidth:
+                self._last_action = "down"
+                return max(1, limit - 1)
+            self._last_action = "up"
+            return min(self.max_downloads, limit + 1)
+
+        self._last_action = None
+        return limit
+
+    async def control_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            metrics = self.sample()
+            if self.adaptive:
+                await self.downloads.set_limit(self.next_limit(metrics))
+            self._last_bandwidth = metrics["bandwidth_MBps"]
+            self.history.append(metrics)
+            logging.info(f"Scheduler: {metrics['downloading']:.1f}/{metrics['download_limit']} downloading, "
+                         f"{metrics['waiting_for_cpu']:.1f} waiting for CPU, "
+                         f"{metrics['worker_utilization']:.0%} worker utilization, "
+                         f"{metrics['bandwidth_MBps']:.1f} MB/s")
+
+    def summary(self) -> dict:
+        def mean(key: str) -> float:
+            return sum(m[key] for m in self.history) / len(self.history) if self.history else 0.0
+
+        return {
+            "bytes_downloaded": self.bytes_downloaded,
+            "final_download_limit": self.downloads.limit,
+            "mean_waiting_for_cpu": mean("waiting_for_cpu"),
+            "mean_worker_utilization": mean("worker_utilization"),
+            "mean_bandwidth_MBps": mean("bandwidth_MBps"),
+            "history": self.history,
+        }
@@ -0,0 +1,142 @@
+import logging
+import os
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from data_filtering.data_pipeline.shards import SHARD_SUFFIX, ShardWriter, index_path
+from data_filtering.data_pipeline.stage_1.filter_chain import passes
+from data_filtering.filtering_utilities.document_features import FEATURES, DocumentFeatures, StoredFeatures
+
+CANDIDATES_SUFFIX = ".candidates" + SHARD_SUFFIX
+SCORES_SUFFIX = ".scores.npz"
+# Heuristic verdicts are stored as ok_<predicate name> columns
+HEURISTIC_PREFIX = "ok_"
+# Every other score column, so a shard without any extracted document still gets all of them
+SCORE_COLUMNS = {
+    "lang": str,
+    "lang_score": np.float64,
+    "nsfw_label": str,
+    "nsfw_score": np.float64,
+    "quality_label": str,
+    "quality_score": np.float64,
+    "extracted_chars": np.int32,
+    "final_bytes": np.int32,
+    # The heuristics' inputs, so their cutoffs can move too
+    **{name: np.int32 for name in FEATURES},
+}
+
+
+def candidates_path(shard_path: str | os.PathLike) -> Path:
+    # Every extracted document, kept or not, in its final (line-filtered, masked) form
+    shard_path = Path(shard_path)
+    return shard_path.with_name(shard_path.name[:-len(SHARD_SUFFIX)] + CANDIDATES_SUFFIX)
+
+
+def scores_path(shard_path: str | os.PathLike) -> Path:
+    shard_path = Path(shard_path)
+    return shard_path.with_name(shard_path.name[:-len(SHARD_SUFFIX)] + SCORES_SUFFIX)
+
+
+def decision_steps(scores: Dict[str, np.ndarray],
+                   lang: str,
+                   confidence: float,
+                   nsfw_threshold: float,
+                   quality_threshold: float,
+                   heuristics: Iterable[str] | None = None) -> List[Tuple[str, np.ndarray]]:
+    # The Stage 1 decision as (rejection reason, passed) pairs, in the order rejections are reported
+    if heuristics is None:
+        heuristics = heuristic_names(scores)
+    return [
+        ("language", (scores["lang"] == lang) & (scores["lang_score"] >= confidence)),
+        *[(name, scores[HEURISTIC_PREFIX + name]) for name in heuristics],
+        ("nsfw", (scores["nsfw_label"] == "non-nsfw") & (scores["nsfw_score"] >= nsfw_threshold)),
+        ("quality", (scores["quality_label"] == "good") & (scores["quality_score"] >= quality_threshold)),
+        ("empty_after_filtering", scores["final_bytes"] > 0),
+    ]
+
+
+def keep_mask(scores: Dict[str, np.ndarray],
+              lang: str,
+              confidence: float,
+              nsfw_threshold: float,
+              quality_threshold: float,
+              heuristics: Iterable[str] | None = None) -> np.ndarray:
+    # Shared by the inline filter and the rethreshold tool
+    mask = np.ones(len(scores["final_bytes"]), dtype=bool)
+    for _, passed in decision_steps(scores, lang, confidence, nsfw_threshold, quality_threshold, heuristics):
+        mask &= passed
+    return mask
+
+
+def heuristic_names(columns: Iterable[str]) -> List[str]:
+    # From the column names of a scores file, or from its dict of columns
+    return [key[len(HEURISTIC_PREFIX):] for key in columns if key.startswith(HEURISTIC_PREFIX)]
+
+
+def feature_values(doc: DocumentFeatures) -> Dict[str, int]:
+    # A document whose features cannot be computed is stored with zeros, which every heuristic rejects
+    try:
+        return {name: getattr(doc, name) for name in FEATURES}
+    except Exception as e:
+        logging.warning(f"Failed to compute the features of a document: {e}")
+        return dict.fromkeys(FEATURES, 0)
+
+
+def feature_columns(documents: List[DocumentFeatures]) -> Dict[str, np.ndarray]:
+    rows = [feature_values(doc) for doc in documents]
+    return {name: np.array([row[name] for row in rows], dtype=np.int32) for name in FEATURES}
+
+
+def replay_heuristic(scores: Dict[str, np.ndarray], heuristic: Callable[[DocumentFeatures], bool]) -> np.ndarray:
+    # The heuristic's verdict on every document, from its stored features
+    return np.array([passes(heuristic, StoredFeatures({name: scores[name][row] for name in FEATURES}))
+                     for row in range(len(scores["final_bytes"]))], dtype=bool)
+
+
+def load_scores(path: str | os.PathLike) -> Dict[str, np.ndarray]:
+    with np.load(path) as npz:
+        return {key: npz[key] for key in npz.files}
+
+
+class ScoreSidecar:
+    # Columnar scores of every extracted document of a shard, next to the candidate texts they describe
+    def __init__(self, shard_path: str | os.PathLike, heuristics: Iterable[str]):
+        self.shard_path = Path(shard_path)
+        self.candidates = ShardWriter(candidates_path(shard_path))
+        self.dtypes = {**SCORE_COLUMNS, **{HEURISTIC_PREFIX + name: bool for name in heuristics}}
+        self.columns: Dict[str, List[np.ndarray]] = {}
+
+    def add(self, final_texts: List[str], columns: Dict[str, np.ndarray]):
+        for text in final_texts:
+            self.candidates.write(text)
+        for key, values in columns.items():
+            self.columns.setdefault(key, []).append(np.asarray(values))
+
+    def close(self):
+        self.candidates.close()
+        scores = {key: np.array([], dtype=dtype) for key, dtype in self.dtypes.items()}
+        scores.update({key: np.concatenate(values) for key, values in self.columns.items()})
+
+        # Rows follow the candidate shard, its index gives each document's id and byte range
+        ids, offsets, lengths = [], [], []
+        with open(index_path(self.candidates.shard_path), "r", encoding="utf-8") as f:
+            for line in f:
+                doc_id, offset, length = line.rstrip("\n").split("\t")
+                ids.append(doc_id)
+                offsets.append(int(offset))
+                lengths.append(int(length))
+        scores["doc_id"] = np.array(ids, dtype="U32")
+        scores["doc_offset"] = np.array(offsets, dtype=np.int64)
+        scores["doc_length"] = np.array(lengths, dtype=np.int32)
+
+        tmp_path = scores_path(self.shard_path).with_suffix(".tmp.npz")
+        np.savez_compressed(tmp_path, **scores)
+        os.replace(tmp_path, scores_path(self.shard_path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,131 @@
+import math
+import os
+from pathlib import Path
+from typing import List, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+import mmh3
+import numpy as np
+
+from data_filtering.data_pipeline.shards import SHARD_SUFFIX
+
+SEEN_NAME = "seen.bloom"
+SEEN_SUFFIX = ".seen.npy"
+BLOOM_MAGIC = b"STG1BLM\0"
+# Magic, then the number of hash functions as an uint64
+HEADER_BYTES = 16
+
+
+def seen_path(shard_path: str | os.PathLike) -> Path:
+    # Sidecar of the keys a shard added, merged into the global filter once the shard is done
+    shard_path = Path(shard_path)
+    return shard_path.with_name(shard_path.name[:-len(SHARD_SUFFIX)] + SEEN_SUFFIX)
+
+
+def normalize_url(url: str) -> str:
+    # http and https, the fragment, default ports and a trailing slash do not make another page
+    parts = urlsplit(url.strip())
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port not in (80, 443):
+        host = f"{host}:{parts.port}"
+    return urlunsplit(("", host, parts.path.rstrip("/") or "/", parts.query, ""))
+
+
+def key_hash(key: str) -> Tuple[int, int]:
+    return mmh3.hash64(key, signed=False)
+
+
+def bloom_size(capacity: int, error_rate: float) -> Tuple[int, int]:
+    num_bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+    num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+    # Whole bytes
+    return (num_bits + 7) // 8 * 8, num_hashes
+
+
+class BloomFilter:
+    # Bits in a memory-mapped file: the parent sets them, the workers read them concurrently.
+    # Bits are only ever set, a racing reader can at worst miss a key that was just added.
+    def __init__(self, path: str | os.PathLike, mode: str = "r"):
+        with open(path, "rb") as f:
+            header = f.read(HEADER_BYTES)
+        if header[:8] != BLOOM_MAGIC:
+            raise ValueError(f"{path} is not a seen-set file")
+        self.num_hashes = int(np.frombuffer(header[8:], dtype=np.uint64)[0])
+        self.bits = np.memmap(path, dtype=np.uint8, mode=mode, offset=HEADER_BYTES)
+        self.num_bits = self.bits.size * 8
+
+    @classmethod
+    def create(cls, path: str | os.PathLike, capacity: int, error_rate: float) -> "BloomFilter":
+        path = Path(path)
+        if not path.exists():
+            num_bits, num_hashes = bloom_size(capacity, error_rate)
+            tmp_path = path.with_name(f".{path.name}.tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(BLOOM_MAGIC + np.uint64(num_hashes).tobytes())
+                f.truncate(HEADER_BYTES + num_bits // 8)
+            os.replace(tmp_path, path)
+        return cls(path, mode="r+")
+
+    def positions(self, hashes: np.ndarray) -> np.ndarray:
+        # Double hashing, h1 + i * h2 for the i-th function
+        h1, h2 = hashes[:, :1], hashes[:, 1:]
+        steps = np.arange(self.num_hashes, dtype=np.uint64)
+        return (h1 + steps * h2) % np.uint64(self.num_bits)
+
+    def __contains__(self, hashes: Tuple[int, int]) -> bool:
+        positions = self.positions(np.array([hashes], dtype=np.uint64))[0]
+        return bool(np.all(self.bits[positions >> np.uint64(3)] & (1 << (positions & np.uint64(7))).astype(np.uint8)))
+
+    def add_hashes(self, hashes: np.ndarray):
+        if hashes.size == 0:
+            return
+        positions = self.positions(hashes).ravel()
+        np.bitwise_or.at(self.bits, positions >> np.uint64(3), (1 << (positions & np.uint64(7))).astype(np.uint8))
+        self.bits.flush()
+
+
+class SeenSet:
+    # Worker side: checks records against the filter of finished shards and against the
+    # records of its own shard, collects the keys for the shard's sidecar
+    def __init__(self, bloom_path: str | os.PathLike | None):
+        self.bloom = BloomFilter(bloom_path) if bloom_path and Path(bloom_path).exists() else None
+        self.local = set()
+        self.hashes: List[Tuple[int, int]] = []
+
+    def seen(self, key: str) -> bool:
+        hashes = key_hash(key)
+        if hashes in self.local or (self.bloom is not None and hashes in self.bloom):
+            return True
+        self.local.add(hashes)
+        self.hashes.append(hashes)
+        return False
+
+    def duplicate_reason(self, record) -> str | None:
+        digest = record.headers.get("WARC-Payload-Digest") or record.headers.get("WARC-Block-Digest")
+        if digest and self.seen(f"digest:{digest}"):
+            return "duplicate.digest"
+        url = record.headers.get("WARC-Target-URI")
+        if url and self.seen(f"url:{normalize_url(url)}"):
+            return "duplicate.url"
+        return None
+
+    def save(self, path: str | os.PathLike):
+        np.save(path, np.array(self.hashes, dtype=np.uint64).reshape(-1, 2))
+
+
+def reset_seen_set(stage1_dir: str | os.PathLike):
+    # A new ledger starts a new run: keys of a previous run in the same directory would reject
+    # every record of the (seeded, so identical) shards it samples again
+    (Path(stage1_dir) / SEEN_NAME).unlink(missing_ok=True)
+
+
+def open_seen_set(args) -> SeenSet | None:
+    if not args.seen_set:
+        return None
+    return SeenSet(Path(args.STAGE1_DIR) / SEEN_NAME)
+
+
+def merge_seen(bloom: BloomFilter, shard_path: str | os.PathLike):
+    sidecar = seen_path(shard_path)
+    if sidecar.exists():
+        bloom.add_hashes(np.load(sidecar))
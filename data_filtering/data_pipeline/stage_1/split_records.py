@@ -0,0 +1,115 @@
+import asyncio
+import concurrent.futures
+import logging
+import multiprocessing
+import queue as queue_module
+import time
+from argparse import Namespace
+from functools import partial
+from pathlib import Path
+from typing import List, Tuple
+
+from data_filtering.data_pipeline.stage_1.processing_one_file import filter_record_batch, write_shard
+from data_filtering.data_pipeline.stage_1.record_batches import END_OF_SHARD, read_record_batches, release_records
+from data_filtering.data_pipeline.stage_1.stats import merge_stats
+
+
+class RecordSplitter:
+    # --split_records: a reader process per shard decompresses and splits the records,
+    # batches of raw payloads go through shared memory to the whole worker pool.
+    # A single large shard keeps every worker busy instead of one.
+    def __init__(self,
+                 args: Namespace,
+                 process_pool: concurrent.futures.ProcessPoolExecutor):
+        self.process_pool = process_pool
+        self.manager = multiprocessing.Manager()
+        self.reader_pool = concurrent.futures.ProcessPoolExecutor(max_workers=args.max_concurrent_downloads)
+        # Blocking queue reads, one per shard being split
+        self.queue_pool = concurrent.futures.ThreadPoolExecutor(max_workers=args.max_concurrent_downloads)
+        # Caps the shared memory held by batches waiting for a worker, across all shards
+        self.in_flight = asyncio.Semaphore(2 * args.num_workers)
+
+    async def filter_shard(self,
+                           source: str | Path,
+                           is_pipe: bool,
+                           args: Namespace,
+                           loop,
+                           shard_path: Path) -> Tuple[List[str], dict]:
+        start = time.perf_counter()
+        batches = self.manager.Queue(maxsize=2)
+        reader = loop.run_in_executor(self.reader_pool, read_record_batches, str(source), is_pipe, args, batches,
+                                      shard_path)
+
+        tasks = []
+        try:
+            while True:
+                await self.in_flight.acquire()
+                try:
+                    item = await self.next_batch(batches, reader, loop)
+                except BaseException:
+                    self.in_flight.release()
+                    raise
+                if item is END_OF_SHARD:
+                    self.in_flight.release()
+                    break
+                tasks.append(asyncio.ensure_future(self.filter_batch(item, args, loop)))
+
+            read_stats = await reader
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.release_pending(batches, reader, loop)
+            raise
+
+        write_stats = await loop.run_in_executor(None, write_shard, shard_path, [kept for kept, _ in results])
+        stats = merge_stats([read_stats, *(batch_stats for _, batch_stats in results), write_stats])
+        stats["seconds"]["total"] = time.perf_counter() - start
+
+        total_records, kept_records = stats["counts"].get("records", 0), stats["counts"].get("kept", 0)
+        logging.info(f"Finished one file in {len(results)} batches. Processed: {total_records}, Kept: {kept_records} "
+                     f"({kept_records / total_records if total_records != 0 else 1:.2%})")
+        return [str(shard_path)], stats
+
+    async def next_batch(self, batches, reader: asyncio.Future, loop):
+        while True:
+            try:
+                return await loop.run_in_executor(self.queue_pool, partial(batches.get, timeout=1.0))
+            except queue_module.Empty:
+                # A reader killed before its sentinel would leave us waiting forever
+                if reader.done():
+                    reader.result()
+
+    async def release_pending(self, batches, reader: asyncio.Future, loop):
+        # After a failure: batches left in the queue, or still coming from a live reader, reach no
+        # worker and would stay in /dev/shm, their blocks are no longer tracked by resource_tracker
+        while True:
+            try:
+                item = await loop.run_in_executor(self.queue_pool, partial(batches.get, timeout=1.0))
+            except queue_module.Empty:
+                if reader.done():
+                    return
+                continue
+            except Exception as e:
+                logging.warning(f"Could not drain the record batches of a failed shard: {e!r}")
+                return
+            if item is END_OF_SHARD:
+                return
+            release_records(item[0])
+
+    async def filter_batch(self,
+                           item: Tuple[str, List[int], List[str | None]],
+                           args: Namespace,
+                           loop) -> Tuple[List[str], dict]:
+        shm_name, offsets, charsets = item
+        try:
+            return await loop.run_in_executor(self.process_pool, filter_record_batch, shm_name, offsets, charsets, args)
+        except BaseException:
+            release_records(shm_name)
+            raise
+        finally:
+            self.in_flight.release()
+
+    def shutdown(self):
+        self.reader_pool.shutdown()
+        self.queue_pool.shutdown()
+        self.manager.shutdown()
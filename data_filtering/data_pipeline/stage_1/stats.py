@@ -0,0 +1,131 @@
+import json
+import os
+import resource
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List
+from data_filtering.data_pipeline.utils import atomic_write_text
+
+
+def size_bucket(num_bytes: int) -> str:
+    # Power-of-two upper bound, "1024" holds records of 513 to 1024 bytes
+    return str(1 << max(0, num_bytes - 1).bit_length())
+
+
+def time_bucket(seconds: float) -> str:
+    # Power-of-two upper bound in milliseconds, "4" holds extractions of 2 to 4 ms
+    return str(1 << max(0, int(seconds * 1000) - 1).bit_length())
+
+
+class ShardStats:
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.rejected = defaultdict(int)
+        self.counts = defaultdict(int)
+        self.record_sizes = defaultdict(int)
+        self.extract_ms = defaultdict(int)
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.workers = {}
+
+    @contextmanager
+    def timer(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[stage] += time.perf_counter() - start
+
+    def reject(self, reason: str, num_docs: int = 1):
+        if num_docs:
+            self.rejected[reason] += num_docs
+
+    def add_record(self, num_bytes: int):
+        self.counts["records_read"] += 1
+        self.bytes_in += num_bytes
+        self.record_sizes[size_bucket(num_bytes)] += 1
+
+    def add_extract_time(self, seconds: float):
+        self.extract_ms[time_bucket(seconds)] += 1
+
+    def add_output(self, text: str):
+        self.counts["kept"] += 1
+        self.bytes_out += len(text.encode("utf-8"))
+
+    def add_worker(self, pid: int, **info):
+        self.workers[str(pid)] = info
+
+    def to_dict(self) -> dict:
+        return {
+            "seconds": dict(self.seconds),
+            "rejected": dict(self.rejected),
+            "counts": dict(self.counts),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "record_sizes": dict(self.record_sizes),
+            "extract_ms": dict(self.extract_ms),
+            "workers": dict(self.workers),
+        }
+
+
+def process_memory() -> dict:
+    # PSS splits the copy-on-write model pages between the workers that share them, RSS counts them in full
+    memory = {"max_rss_MB": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+    try:
+        with open("/proc/self/smaps_rollup", encoding="utf-8") as f:
+            for line in f:
+                key, value = line.split(":", 1)
+                if key in ("Rss", "Pss"):
+                    memory[f"{key.lower()}_MB"] = int(value.split()[0]) / 1024
+    except OSError:
+        pass
+    return memory
+
+
+def merge_stats(stats_dicts: List[dict]) -> dict:
+    merged = {"seconds": defaultdict(float), "rejected": defaultdict(int), "counts": defaultdict(int),
+              "bytes_in": 0, "bytes_out": 0, "record_sizes": defaultdict(int),
+              "extract_ms": defaultdict(int), "workers": {}}
+    for stats in stats_dicts:
+        for key in ("seconds", "rejected", "counts", "record_sizes", "extract_ms"):
+            for name, value in stats.get(key, {}).items():
+                merged[key][name] += value
+        merged["bytes_in"] += stats.get("bytes_in", 0)
+        merged["bytes_out"] += stats.get("bytes_out", 0)
+        # Latest snapshot of each worker process
+        merged["workers"].update(stats.get("workers", {}))
+
+    return {key: dict(value) if isinstance(value, defaultdict) else value
+            for key, value in merged.items()}
+
+
+def stats_path(manifest_path: str | os.PathLike) -> Path:
+    return Path(manifest_path).with_suffix(".stats.json")
+
+
+def write_run_report(report_path: str | os.PathLike,
+                     manifests: List[str],
+                     **extra):
+    shard_stats = [json.loads(stats_path(m).read_text(encoding="utf-8"))
+                   for m in manifests if stats_path(m).exists()]
+    report = {**extra, "shards": len(shard_stats), **merge_stats(shard_stats)}
+    atomic_write_text(report_path, json.dumps(report, indent=2))
+    return report
+
+
+class StatsStream:
+    # Appends one JSON line per finished shard so a running job can be watched with tail -f
+    def __init__(self, path: str | os.PathLike | None):
+        self._file = open(path, "a", encoding="utf-8") if path else None
+
+    def write(self, url: str, stats: dict):
+        if self._file is None:
+            return
+        self._file.write(json.dumps({"url": url, "time": time.time(), **stats}) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
@@ -0,0 +1,95 @@
+import asyncio
+import errno
+import fcntl
+import io
+import logging
+import os
+import tempfile
+from argparse import Namespace
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class PipeReader(io.RawIOBase):
+    # fastwarc asks the underlying stream for tell(), which pipes cannot answer
+    def __init__(self, pipe):
+        self._pipe = pipe
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def readinto(self, b):
+        n = self._pipe.readinto(b) or 0
+        self._pos += n
+        return n
+
+
+@contextmanager
+def shard_pipe():
+    with tempfile.TemporaryDirectory(prefix="stage1_pipe_") as tmp_dir:
+        pipe_path = Path(tmp_dir) / "shard.pipe"
+        os.mkfifo(pipe_path)
+        yield pipe_path
+
+
+async def open_pipe_writer(pipe_path: str | os.PathLike,
+                           buffer_size: int,
+                           worker: asyncio.Future):
+    # A non-blocking open fails with ENXIO until the worker opens the read end,
+    # polling keeps the event loop free while the shard waits for a free worker.
+    while True:
+        try:
+            fd = os.open(pipe_path, os.O_WRONLY | os.O_NONBLOCK)
+            break
+        except OSError as e:
+            if e.errno != errno.ENXIO:
+                raise
+            if worker.done():
+                raise RuntimeError("Worker exited before opening the shard pipe")
+            await asyncio.sleep(0.05)
+
+    os.set_blocking(fd, True)
+    try:
+        fcntl.fcntl(fd, fcntl.F_SETPIPE_SZ, buffer_size)
+    except OSError:
+        # Capped by /proc/sys/fs/pipe-max-size, keep the kernel default
+        pass
+
+    return os.fdopen(fd, "wb")
+
+
+async def release_pipe_reader(pipe_path: str | os.PathLike,
+                              worker: asyncio.Future):
+    # After a failure: opens and closes the write end once the worker holds the read end,
+    # so a worker blocked in open() reads an empty stream and exits instead of waiting forever
+    warned = False
+    while not worker.done():
+        try:
+            os.close(os.open(pipe_path, os.O_WRONLY | os.O_NONBLOCK))
+            return
+        except OSError as e:
+            if e.errno != errno.ENXIO and not warned:
+                logging.warning(f"Could not open {pipe_path} to release its reader, retrying: {e}")
+                warned = True
+        await asyncio.sleep(0.05)
+
+
+async def stream_to_worker(download,
+                           pipe_path: str | os.PathLike,
+                           worker: asyncio.Future,
+                           args: Namespace,
+                           loop,
+                           pipe_pool):
+    buffer_size = args.stream_buffer_MB * 1024 * 1024
+    pipe = await open_pipe_writer(pipe_path, buffer_size, worker)
+
+    try:
+        async for chunk in download.iter_chunked(buffer_size):
+            # Blocking write: the full pipe is what throttles the download
+            await loop.run_in_executor(pipe_pool, pipe.write, chunk)
+    finally:
+        pipe.close()
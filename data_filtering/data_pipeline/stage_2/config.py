@@ -20,6 +20,11 @@ def parse_args():
                         default=8,
                         help="Num of workers for process loop")
 
+    parser.add_argument("--line_dedup_backend",
+                        choices=["memory", "sqlite"],
+                        default="memory",
+                        help="Exact line dedup counts: in-memory hash tables, or a SQLite database for inputs bigger than RAM")
+
     parser.add_argument("--num_hashes",
                         type=int,
                         default=128,
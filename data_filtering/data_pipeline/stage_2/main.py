@@ -6,6 +6,7 @@ from data_filtering.utils import setup_logging
 from data_filtering.deduplication.exact_line_deduplication_parallel import exact_line_dedup_parallel
 from data_filtering.deduplication.minhash_deduplication_parallel import minhash_deduplication_parallel
 from data_filtering.data_pipeline.stage_2.config import parse_args
+from data_filtering.data_pipeline.shards import SHARD_SUFFIX, doc_refs
 
 
 if __name__ == "__main__":
@@ -31,13 +32,17 @@ if __name__ == "__main__":
         exact_line_dedup_parallel(
             input_list_path_exact,
             tmp_exact_output,
-            args.num_workers
+            args.num_workers,
+            args.line_dedup_backend
         )
 
+        # Packed shards are expanded into one reference per document
         input_list_path_fuzzy = glob.glob(f"{tmp_exact_output}/*.txt")
+        for shard_path in glob.glob(f"{tmp_exact_output}/*{SHARD_SUFFIX}"):
+            input_list_path_fuzzy.extend(doc_refs(shard_path))
 
         logging.info(f"Successfully finished exact line deduplication, "
-                     f"retained {len(input_list_path_fuzzy)} files")
+                     f"retained {len(input_list_path_fuzzy)} documents")
 
         logging.info("Starting fuzzy deduplication...")
 
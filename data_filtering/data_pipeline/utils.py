@@ -1,20 +1,146 @@
+import hashlib
+import os
 import random
+import tempfile
+from pathlib import Path
 from typing import List
 import requests
 import gzip
 from io import BytesIO
-BASE = "https://data.commoncrawl.org/crawl-data/CC-MAIN-2025-21"
+CC_BASE_URL = "https://data.commoncrawl.org"
+CRAWL_ID = "CC-MAIN-2025-21"
 
-def list_file_paths(max_files: int = 5000,
-                    is_wet: bool = False, ) -> List[str]:
-    paths_url = "wet.paths.gz" if is_wet else "warc.paths.gz"
-    idx_url = f"{BASE}/{paths_url}"
-    response = requests.get(idx_url)
+FILE_PREFIX = "file://"
+WARC_SUFFIX = ".warc.gz"
+WET_SUFFIX = ".warc.wet.gz"
+
+
+def is_remote(url: str) -> bool:
+    return url.startswith(("http://", "https://"))
+
+
+def local_path(url: str) -> Path:
+    return Path(url[len(FILE_PREFIX):] if url.startswith(FILE_PREFIX) else url)
+
+
+def matches_kind(path: str, is_wet: bool) -> bool:
+    return path.endswith(WET_SUFFIX) if is_wet else path.endswith(WARC_SUFFIX) and not path.endswith(WET_SUFFIX)
+
+
+def sample_paths(all_paths: List[str],
+                 max_files: int,
+                 seed: int | None = None,
+                 shard_index: int = 0,
+                 num_shards: int = 1) -> List[str]:
+    # Same seed, same order on every host: each host takes every num_shards-th path, so the
+    # subsets are disjoint without any coordination
+    if not 0 <= shard_index < num_shards:
+        raise ValueError(f"shard_index must be in [0, {num_shards}), got {shard_index}")
+    all_paths = sorted(all_paths)
+    random.Random(seed).shuffle(all_paths)
+    return all_paths[shard_index::num_shards][:max_files]
+
+
+def base_url_key(base_url: str) -> str:
+    # Cache directory of a mirror: indexes of the same crawl differ from one mirror to another
+    scheme, sep, rest = base_url.rstrip("/").partition("://")
+    host, slash, path = rest.partition("/")
+    normalized = f"{scheme.lower()}{sep}{host.lower()}{slash}{path}" if sep else base_url.rstrip("/")
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+def load_path_index(is_wet: bool = False,
+                    base_url: str = CC_BASE_URL,
+                    crawl_id: str = CRAWL_ID,
+                    cache_dir: str | os.PathLike | None = None) -> List[str]:
+    paths_name = "wet.paths.gz" if is_wet else "warc.paths.gz"
+    idx_url = f"{base_url}/crawl-data/{crawl_id}/{paths_name}"
+    cache_path = Path(cache_dir) / base_url_key(base_url) / crawl_id / paths_name if cache_dir else None
 
-    with gzip.open(BytesIO(response.content), "rt", encoding="utf-8") as f:
-        all_paths = f.read().splitlines()
-    random.shuffle(all_paths)
-    sampled_paths = all_paths[:max_files]
+    if cache_path is not None and cache_path.exists():
+        # A crawl's index never changes once published
+        content = cache_path.read_bytes()
+    elif is_remote(idx_url):
+        response = requests.get(idx_url)
+        response.raise_for_status()
+        content = response.content
+        if cache_path is not None:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            atomic_write_bytes(cache_path, content)
+    elif local_path(idx_url).exists():
+        content = local_path(idx_url).read_bytes()
+    else:
+        # Local mirror without an index, list the shards on disk instead
+        root = local_path(base_url)
+        content = gzip.compress("\n".join(
+            sorted(p.relative_to(root).as_posix() for p in (root / "crawl-data" / crawl_id).rglob("*")
+                   if matches_kind(p.name, is_wet))
+        ).encode("utf-8"))
 
-    return [f"https://data.commoncrawl.org/{p}"
+    with gzip.open(BytesIO(content), "rt", encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def list_file_paths(max_files: int = 5000,
+                    is_wet: bool = False,
+                    base_url: str = CC_BASE_URL,
+                    crawl_id: str = CRAWL_ID,
+                    seed: int | None = None,
+                    shard_index: int = 0,
+                    num_shards: int = 1,
+                    cache_dir: str | os.PathLike | None = None) -> List[str]:
+    all_paths = load_path_index(is_wet, base_url, crawl_id, cache_dir)
+    sampled_paths = sample_paths(all_paths, max_files, seed, shard_index, num_shards)
+
+    return [f"{base_url}/{p}"
             for p in sampled_paths]
+
+
+def list_local_paths(source: str,
+                     max_files: int = 5000,
+                     is_wet: bool = False,
+                     seed: int | None = None,
+                     shard_index: int = 0,
+                     num_shards: int = 1) -> List[str]:
+    # A directory of shards, or a text file listing one shard path or URL per line
+    source_path = local_path(source)
+    if source_path.is_dir():
+        all_paths = [str(p) for p in source_path.rglob("*") if matches_kind(p.name, is_wet)]
+    else:
+        all_paths = []
+        for line in source_path.read_text(encoding="utf-8").splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            # Relative entries are resolved against the list itself
+            if not is_remote(line) and not line.startswith(FILE_PREFIX) and not os.path.isabs(line):
+                line = str(source_path.parent / line)
+            all_paths.append(line)
+
+    return sample_paths(all_paths, max_files, seed, shard_index, num_shards)
+
+
+def atomic_write_text(path: str | os.PathLike, text: str):
+    atomic_write_bytes(path, text.encode("utf-8"))
+
+
+def atomic_write_bytes(path: str | os.PathLike, content: bytes):
+    path = Path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    # Persist the rename itself
+    dir_fd = os.open(path.parent, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
@@ -1,12 +1,48 @@
 import logging
-from typing import List
+from typing import Callable, Iterable, List, Sequence, Tuple
 from tempfile import TemporaryDirectory
 from pathlib import Path
-import hashlib
 import os
+import mmh3
+import numpy as np
 from tqdm import tqdm
 from concurrent.futures import ProcessPoolExecutor, as_completed
 from data_filtering.deduplication.utils import setup_db_connection
+from data_filtering.data_pipeline.shards import is_shard, iter_documents, ShardWriter
+
+# memory: per-worker hash tables merged in the parent, sqlite: shared database for inputs bigger than RAM
+LINE_DEDUP_BACKENDS = ("memory", "sqlite")
+
+
+def iter_lines(path: str | os.PathLike):
+    if is_shard(path):
+        for _, text in iter_documents(path):
+            yield from text.encode("utf-8").split(b"\n")
+    else:
+        with open(path, "rb") as f:
+            yield from f
+
+
+def line_hashes(lines: Iterable[bytes]) -> np.ndarray:
+    # 64-bit MurmurHash3 of each stripped line, signed so SQLite stores it as an INTEGER key as is
+    return np.fromiter((mmh3.hash64(line.strip())[0] for line in lines), dtype=np.int64)
+
+
+def local_hash_counts(path: str | os.PathLike) -> Tuple[np.ndarray, np.ndarray]:
+    # Sorted distinct hashes of one file and their counts
+    return np.unique(line_hashes(iter_lines(path)), return_counts=True)
+
+
+def merge_hash_counts(keys: List[np.ndarray],
+                      counts: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    keys, counts = np.concatenate(keys), np.concatenate(counts)
+    if not len(keys):
+        return keys, counts
+    order = np.argsort(keys, kind="stable")
+    keys, counts = keys[order], counts[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return keys[starts], np.add.reduceat(counts, starts)
+
 
 def local_hashes_counter(path: str | os.PathLike,
                          db_path: str | os.PathLike):
@@ -14,78 +50,144 @@ def local_hashes_counter(path: str | os.PathLike,
     cur = conn.cursor()
 
     try:
-        with open(path, "rb") as f:
-            rows = [(
-                hashlib.sha256(line.strip()).hexdigest(), 1)
-                for line in f
-            ]
-
+        # Repeated lines of a file are counted before they reach the shared database, and the
+        # whole file is one transaction instead of one autocommit per hash
+        keys, counts = local_hash_counts(path)
+        cur.execute("BEGIN IMMEDIATE")
         cur.executemany(
             """
                   INSERT INTO hash_cnt(hash, cnt) VALUES(?, ?)
-                  ON CONFLICT(hash) DO UPDATE SET cnt=cnt+1
+                  ON CONFLICT(hash) DO UPDATE SET cnt=cnt+excluded.cnt
                   """,
-            rows
+            zip(keys.tolist(), counts.tolist())
         )
+        cur.execute("COMMIT")
     finally:
         conn.close()
 
 
+def unique_mask(hashes: np.ndarray, uniques: np.ndarray) -> np.ndarray:
+    # Membership of each hash in the sorted array of hashes seen exactly once
+    if not len(uniques):
+        return np.zeros(len(hashes), dtype=bool)
+    positions = np.minimum(np.searchsorted(uniques, hashes), len(uniques) - 1)
+    return uniques[positions] == hashes
+
+
+def write_kept_lines(path: str | os.PathLike,
+                     output_path: Path,
+                     keep: Callable[[List[bytes]], Sequence[bool]]):
+    # keep decides on all lines of the file at once
+    if is_shard(path):
+        # Documents left without any line are dropped from the output shard
+        documents = [(doc_id, text.split("\n")) for doc_id, text in iter_documents(path)]
+        mask = iter(keep([line.encode("utf-8") for _, lines in documents for line in lines]))
+        with ShardWriter(output_path) as writer:
+            for doc_id, lines in documents:
+                kept = [line for line in lines if next(mask)]
+                if kept:
+                    writer.write("\n".join(kept), doc_id)
+    else:
+        with open(path, "rb") as f_input:
+            lines = f_input.readlines()
+        with open(output_path, "wb") as f_output:
+            f_output.writelines(line for line, kept in zip(lines, keep(lines)) if kept)
+
+
 def write_uniques(path: str | os.PathLike,
                   output_dir: str | os.PathLike,
-                  db_path: str | os.PathLike):
-    conn = setup_db_connection(db_path, read_only=True)
-    cur = conn.cursor()
+                  uniques_path: str | os.PathLike):
+    # One bulk probe of every line of the file, the array is mapped rather than loaded
+    uniques = np.load(uniques_path, mmap_mode="r")
+    write_kept_lines(path, Path(output_dir) / Path(path).name,
+                     lambda lines: unique_mask(line_hashes(lines), uniques))
+
+
+def run_per_file(fn, list_paths: List[str] | list[os.PathLike], args: tuple, num_workers: int, desc: str):
+    # Yields the result of fn(path, *args) for each file, in completion order; failed files are logged and skipped
+    with ProcessPoolExecutor(max_workers=num_workers) as exe:
+        futures = [exe.submit(fn, path, *args) for path in list_paths]
+        for fut in tqdm(as_completed(futures),
+                        total=len(futures),
+                        desc=desc):
+            try:
+                yield fut.result()
+            except Exception as e:
+                logging.error(f"Worker for {fn.__name__} failed: {e!r}")
+
 
-    output_path = Path(output_dir) / Path(path).name
+def count_lines_memory(list_paths: List[str] | list[os.PathLike],
+                       uniques_path: Path,
+                       num_workers: int):
+    # Per-file tables are merged num_workers at a time, only the hashes seen once are kept on disk
+    keys, counts = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
+    for file_keys, file_counts in run_per_file(local_hash_counts, list_paths, (), num_workers, "Hashing line.."):
+        keys.append(file_keys)
+        counts.append(file_counts)
+        if len(keys) > num_workers:
+            merged_keys, merged_counts = merge_hash_counts(keys, counts)
+            keys, counts = [merged_keys], [merged_counts]
+
+    keys, counts = merge_hash_counts(keys, counts)
+    logging.info(f"Counted {counts.sum()} lines, {len(keys)} distinct")
+    np.save(uniques_path, keys[counts == 1])
+
+
+def count_lines_sqlite(list_paths: List[str] | list[os.PathLike],
+                       db_path: Path,
+                       num_workers: int):
+    conn = setup_db_connection(db_path)
+
+    try:
+        conn.execute("CREATE TABLE IF NOT EXISTS hash_cnt(hash INTEGER PRIMARY KEY, cnt INTEGER)")
+        conn.execute("PRAGMA wal_checkpoint(FULL)")
+    finally:
+        conn.close()
+
+    for _ in run_per_file(local_hashes_counter, list_paths, (db_path,), num_workers, "Hashing line.."):
+        pass
+
+
+def export_uniques(db_path: Path,
+                   uniques_path: Path,
+                   chunk_rows: int = 1 << 20):
+    # Streams the hashes seen once into a sorted .npy on disk: the INTEGER primary key is the rowid,
+    # so the table is scanned in key order and never held in memory
+    conn = setup_db_connection(db_path, read_only=True)
 
     try:
-        with open(output_path, "wb") as f_output, open(path, "rb") as f_input:
-            for line in f_input:
-                h = hashlib.sha256(line.strip()).hexdigest()
-                result = cur.execute("SELECT cnt from hash_cnt WHERE hash=?", (h,)).fetchone()
-                if result and result[0] == 1:
-                    f_output.write(line)
+        total = conn.execute("SELECT COUNT(*) FROM hash_cnt WHERE cnt=1").fetchone()[0]
+        uniques = np.lib.format.open_memmap(uniques_path, mode="w+", dtype=np.int64, shape=(total,))
+        cur = conn.execute("SELECT hash FROM hash_cnt WHERE cnt=1 ORDER BY hash")
+        start = 0
+        while rows := cur.fetchmany(chunk_rows):
+            uniques[start:start + len(rows)] = [h for h, in rows]
+            start += len(rows)
+        uniques.flush()
+        del uniques
     finally:
         conn.close()
 
 
 def exact_line_dedup_parallel(list_paths: List[str] | list[os.PathLike],
                               output_directory: str | os.PathLike,
-                              num_workers: int = None):
+                              num_workers: int = None,
+                              backend: str = "memory"):
+    if backend not in LINE_DEDUP_BACKENDS:
+        raise ValueError(f"Unknown line dedup backend {backend!r}, expected one of {LINE_DEDUP_BACKENDS}")
     num_workers = num_workers or os.cpu_count() or 1
     with TemporaryDirectory(prefix="dedup_") as tmp_root:
-        db_path = Path(tmp_root) / "freqs.db"
-        conn = setup_db_connection(db_path)
-
-        try:
-            conn.execute("CREATE TABLE IF NOT EXISTS hash_cnt(hash TEXT PRIMARY KEY, cnt INTEGER)")
-            conn.execute("PRAGMA wal_checkpoint(FULL)")
-        finally:
-            conn.close()
-
-        with ProcessPoolExecutor(max_workers=num_workers) as exe:
-            futures = [exe.submit(local_hashes_counter, path, db_path)
-                       for path in list_paths]
-            for fut in tqdm(as_completed(futures),
-                            total=len(futures),
-                            desc="Hashing line.."):
-                try:
-                    fut.result()
-                except Exception as e:
-                    logging.error(f"Worker for hash counting failed: {e!r}")
+        # Both backends end with the sorted hashes seen once, which every file is filtered against
+        uniques_path = Path(tmp_root) / "uniques.npy"
+        if backend == "memory":
+            count_lines_memory(list_paths, uniques_path, num_workers)
+        else:
+            db_path = Path(tmp_root) / "freqs.db"
+            count_lines_sqlite(list_paths, db_path, num_workers)
+            export_uniques(db_path, uniques_path)
 
         Path(output_directory).mkdir(parents=True, exist_ok=True)
 
-        with ProcessPoolExecutor(max_workers=num_workers) as exe:
-            futures = [
-                exe.submit(write_uniques, path, output_directory, db_path)
-                for path in list_paths
-            ]
-            for fut in tqdm(as_completed(futures),
-                            total=len(futures),
-                            desc="Writing uniques..."):
-                try:
-                    fut.result()
-                except Exception as e:
-                    logging.error(f"Worker for writing uniques failed: {e!r}")
\ No newline at end of file
+        for _ in run_per_file(write_uniques, list_paths, (output_directory, uniques_path), num_workers,
+                              "Writing uniques..."):
+            pass
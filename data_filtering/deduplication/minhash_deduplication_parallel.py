@@ -6,6 +6,7 @@ from pathlib import Path
 from data_filtering.deduplication.utils import setup_db_connection, build_clusters, get_ngrams, compute_minhash_signature, compute_jaccard
 from tempfile import TemporaryDirectory
 import re
+from data_filtering.data_pipeline.shards import read_text
 
 def lsh_candidates_sqlite(db_path,
                    num_bands:int
@@ -53,8 +54,7 @@ def generate_signature_sqlite(path: str | os.PathLike,
                               num_hashes: int,
                               num_grams: int):
     signature = []
-    with open(path, "r", encoding="utf-8", errors="ignore") as f:
-        text = f.read()
+    text = read_text(path)
     ngram_set = get_ngrams(text, num_grams)
     if  ngram_set:
         signature = compute_minhash_signature(ngram_set, num_hashes)
@@ -174,10 +174,9 @@ def minhash_deduplication_parallel(list_paths: List[str] | list[os.PathLike],
                              total=len(paths_to_write),
                              desc="Writing back to final pre-processed file"):
 
-                with open(path, "r", encoding="utf-8", errors="ignore") as f_in:
-                        text = f_in.read()
-                        # one document per-line convention
-                        text = _whitespace_re.sub(" ", text).strip()
-                        f_out.write(text + "\n")
+                text = read_text(path)
+                # one document per-line convention
+                text = _whitespace_re.sub(" ", text).strip()
+                f_out.write(text + "\n")
         except Exception as e:
             logging.warning(f"Failed to copy file {path}: {e}")
\ No newline at end of file
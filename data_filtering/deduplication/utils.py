@@ -1,24 +1,39 @@
 import string
 import unicodedata
-import re
 import sqlite3
 import os
 from typing import Set, List, Tuple, Dict
 import mmh3
 from collections import defaultdict
 import random
+from data_filtering.data_pipeline.shards import read_text
 
 
-def normalize(text:str) -> str:
-    text = text.lower()
+def normalize_deletes(c: str) -> bool:
+    # Combining marks, control/format/unassigned characters and ASCII punctuation
+    category = unicodedata.category(c)
+    return category == "Mn" or category.startswith("C") or c in string.punctuation
+
+
+class NormalizeTable(dict):
+    # str.translate table for non-ASCII text, filled on first sight
+    def __missing__(self, code: int) -> int | None:
+        self[code] = None if normalize_deletes(chr(code)) else code
+        return self[code]
+
 
-    text = unicodedata.normalize("NFD", text)
-    text = "".join(char for char in text if unicodedata.category(char) != "Mn")
-    text = "".join(ch for ch in text if not unicodedata.category(ch).startswith("C"))
-    text = text.translate(str.maketrans("", "", string.punctuation))
-    text = re.sub(r"\s+", " ", text).strip()
+ASCII_DELETES = bytes(code for code in range(128) if normalize_deletes(chr(code)))
+normalize_table = NormalizeTable()
 
-    return text
+
+def normalize(text:str) -> str:
+    # lower, NFD, then every deleted character in one translate, whitespace runs collapsed by split()
+    if text.isascii():
+        # NFD leaves ASCII as is
+        text = text.encode("ascii").translate(None, ASCII_DELETES).lower().decode("ascii")
+    else:
+        text = unicodedata.normalize("NFD", text.lower()).translate(normalize_table)
+    return " ".join(text.split())
 
 def setup_db_connection(db_path: str | os.PathLike, read_only: bool = False):
     if read_only:
@@ -57,13 +72,8 @@ def compute_jaccard(pair: Tuple[str, str],
                     num_grams:int) -> float:
     path_1, path_2 = pair
 
-    with open(path_1, "r", encoding="utf-8") as f:
-        doc = f.read()
-    ngram_set_1 = get_ngrams(doc, num_grams)
-
-    with open(path_2, "r", encoding="utf-8") as f:
-        doc = f.read()
-    ngram_set_2 = get_ngrams(doc, num_grams)
+    ngram_set_1 = get_ngrams(read_text(path_1), num_grams)
+    ngram_set_2 = get_ngrams(read_text(path_2), num_grams)
 
     jaccard_index = len(ngram_set_1 & ngram_set_2) / len(ngram_set_1 | ngram_set_2)
 
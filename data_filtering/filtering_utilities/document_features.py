@@ -0,0 +1,142 @@
+import re
+from functools import cached_property
+from typing import Dict, List
+
+from nltk import word_tokenize
+
+from data_filtering.filtering_utilities.filter_lines import char_counts
+from data_filtering.filtering_utilities.phrase_matcher import get_phrase_matcher
+
+STOP_WORDS = {"the", "be", "to", "of", "and", "that", "have", "with"}
+SYMBOLS = {"#", "..."}
+HTML_TAG_RE = re.compile(r'<\/?[a-z][^>]*>', re.IGNORECASE)
+URL_RE = re.compile(r'https?://\S+')
+
+# The counts the heuristics decide from, a score sidecar stores them to replay the heuristics
+FEATURES = (
+    "num_chars",
+    "num_words",
+    "word_chars",
+    "unique_words",
+    "alpha_words",
+    "symbol_words",
+    "stop_words",
+    "numeric_words",
+    "num_lines",
+    "ellipsis_lines",
+    "num_tokens",
+    "noise_tokens",
+    "punctuation",
+    "domain_keywords",
+)
+
+
+class DocumentFeatures:
+    # Everything the quality heuristics read from a document, computed on first access and kept,
+    # so a document is tokenized and scanned once however many rules look at it
+    def __init__(self, text: str):
+        self.text = text
+
+    @classmethod
+    def of(cls, doc: "str | DocumentFeatures") -> "DocumentFeatures":
+        return doc if isinstance(doc, DocumentFeatures) else cls(doc)
+
+    @cached_property
+    def words(self) -> List[str]:
+        return word_tokenize(self.text)
+
+    @cached_property
+    def num_chars(self) -> int:
+        return len(self.text)
+
+    @cached_property
+    def num_words(self) -> int:
+        return len(self.words)
+
+    @cached_property
+    def word_chars(self) -> int:
+        return sum(map(len, self.words))
+
+    @cached_property
+    def mean_word_length(self) -> float:
+        return self.word_chars / self.num_words if self.num_words else 0.0
+
+    @cached_property
+    def unique_words(self) -> int:
+        return len(set(self.words))
+
+    @cached_property
+    def _word_counts(self) -> tuple:
+        # One pass over the tokens for every per-word count
+        alpha = symbols = stop_words = numeric = 0
+        for word in self.words:
+            if any(c.isalpha() for c in word):
+                alpha += 1
+            if any(c.isdigit() for c in word):
+                numeric += 1
+            if word.strip() in SYMBOLS:
+                symbols += 1
+            if word.lower() in STOP_WORDS:
+                stop_words += 1
+        return alpha, symbols, stop_words, numeric
+
+    @property
+    def alpha_words(self) -> int:
+        return self._word_counts[0]
+
+    @property
+    def symbol_words(self) -> int:
+        return self._word_counts[1]
+
+    @property
+    def stop_words(self) -> int:
+        return self._word_counts[2]
+
+    @property
+    def numeric_words(self) -> int:
+        return self._word_counts[3]
+
+    @cached_property
+    def lines(self) -> List[str]:
+        return self.text.splitlines()
+
+    @cached_property
+    def num_lines(self) -> int:
+        return len(self.lines)
+
+    @cached_property
+    def ellipsis_lines(self) -> int:
+        return sum(line.strip().endswith("...") for line in self.lines)
+
+    @cached_property
+    def whitespace_tokens(self) -> List[str]:
+        return self.text.split()
+
+    @cached_property
+    def num_tokens(self) -> int:
+        return len(self.whitespace_tokens)
+
+    @cached_property
+    def noise_tokens(self) -> int:
+        # Whitespace tokens holding an HTML tag or a URL
+        return sum(bool(HTML_TAG_RE.search(tok) or URL_RE.search(tok)) for tok in self.whitespace_tokens)
+
+    @cached_property
+    def punctuation(self) -> int:
+        # Characters that are neither alphanumeric nor whitespace
+        return char_counts(self.text)[0]
+
+    @cached_property
+    def domain_keywords(self) -> int:
+        return len(get_phrase_matcher().matches(self.text.lower(), "domain"))
+
+
+class StoredFeatures(DocumentFeatures):
+    # The FEATURES of a document read back from a score sidecar, without its text.
+    # The heuristics only read FEATURES, so they decide the same from either.
+    def __init__(self, values: Dict[str, int]):
+        values = {name: int(values[name]) for name in FEATURES}
+        self.__dict__.update(values)
+        # Read by alpha_words and the other per-word count properties
+        self._word_counts = (values["alpha_words"], values["symbol_words"], values["stop_words"],
+                             values["numeric_words"])
@@ -1,14 +1,60 @@
+import codecs
 import logging
+import re
+from typing import Dict
 
-from resiliparse.parse.encoding import detect_encoding, bytes_to_str
+from resiliparse.parse.encoding import detect_encoding, bytes_to_str, map_encoding_to_html5
 from resiliparse.extract.html2text import extract_plain_text
 
-def extract_text(html_bytes: bytes) -> str:
+# Where detect_encoding(from_html_meta=True) looks for it too
+META_CHARSET_RE = re.compile(rb'<meta[^>]*?charset\s*=\s*["\']?\s*([A-Za-z0-9._:-]+)', re.IGNORECASE)
+META_BYTES = 1024
+
+
+def strict_decode(html_bytes: bytes, encoding: str | None) -> str | None:
+    # None when the label is unknown or the bytes are not valid in it
+    if not encoding:
+        return None
     try:
-        decoded = bytes_to_str(html_bytes, detect_encoding(html_bytes))
+        encoding = map_encoding_to_html5(codecs.lookup(encoding).name)
+        text = html_bytes.decode(encoding)
+    except (LookupError, UnicodeDecodeError):
+        return None
+    return text[1:] if text.startswith("\ufeff") else text
+
+
+def meta_charset(html_bytes: bytes) -> str | None:
+    match = META_CHARSET_RE.search(html_bytes, 0, META_BYTES)
+    return match.group(1).decode("ascii") if match else None
+
+
+def decode_html(html_bytes: bytes,
+                charset: str | None = None,
+                stats: Dict[str, int] | None = None) -> str:
+    # Cheap paths first: valid UTF-8, then the charset of the HTTP header or of a <meta> tag.
+    # Full detection only runs when none of them decodes the payload.
+    path, decoded = "utf8", strict_decode(html_bytes, "utf-8")
+    if decoded is None:
+        path, decoded = "header", strict_decode(html_bytes, charset)
+    if decoded is None:
+        path, decoded = "meta", strict_decode(html_bytes, meta_charset(html_bytes))
+    if decoded is None:
+        path, decoded = "detect", bytes_to_str(html_bytes, detect_encoding(html_bytes))
+
+    if stats is not None:
+        stats[f"encoding.{path}"] = stats.get(f"encoding.{path}", 0) + 1
+    return decoded
+
+
+def extract_text(html_bytes: bytes,
+                 charset: str | None = None,
+                 stats: Dict[str, int] | None = None) -> str:
+    # charset: the encoding declared by the HTTP Content-Type header, if any.
+    # stats: counters, incremented under encoding.<path> for the decoding path taken
+    try:
+        decoded = decode_html(html_bytes, charset, stats)
         text = extract_plain_text(decoded, form_fields=True, main_content=True)
         return text
     except Exception as e:
         logging.warning(f"Text extraction failed: {e}")
         return ""
-
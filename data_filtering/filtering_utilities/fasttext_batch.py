@@ -0,0 +1,33 @@
+import logging
+from typing import List, Tuple
+import numpy as np
+
+def clean_texts(texts: List[str]) -> List[str]:
+    # fastText rejects newlines, clean once and reuse across models
+    return [text.replace('\n', ' ') for text in texts]
+
+def predict_one(cleaned_text: str, model) -> Tuple[str, float]:
+    # A text the model rejects gets no label and a NaN score, which fails every threshold
+    try:
+        labels, probas = model.predict(cleaned_text)
+        return labels[0].replace("__label__", ""), float(probas[0])
+    except Exception as e:
+        logging.warning(f"fastText prediction failed for a {len(cleaned_text)} char text: {e}")
+        return "", float("nan")
+
+def predict_batch(cleaned_texts: List[str],
+                  model) -> Tuple[np.ndarray, np.ndarray]:
+    if not cleaned_texts:
+        return np.array([], dtype=str), np.array([], dtype=np.float64)
+
+    # One call for the whole list instead of one Python-to-C++ round trip per text
+    try:
+        labels, probas = model.predict(cleaned_texts)
+        labels = [label[0].replace("__label__", "") for label in labels]
+        probas = [proba[0] for proba in probas]
+    except Exception as e:
+        # Only the texts that fail on their own are lost, not the whole batch
+        logging.warning(f"fastText batch prediction of {len(cleaned_texts)} texts failed, retrying one by one: {e}")
+        labels, probas = zip(*(predict_one(text, model) for text in cleaned_texts))
+    # float64 like the per-text scores, so exact threshold comparisons do not move
+    return np.array(labels), np.array(probas, dtype=np.float64)
@@ -1,35 +1,76 @@
-from data_filtering.filtering_utilities.filter_lists import BLACKLIST
+import re
+from typing import Tuple
+
+from data_filtering.filtering_utilities.phrase_matcher import get_phrase_matcher
+
+# Character class letters, counted with str.count/bytes.count instead of a Python loop per class
+SPACE, ALNUM, DIGIT, OTHER = "s", "a", "d", "p"
+NON_ASCII = re.compile(r"[^\x00-\x7f]")
+
+
+def char_class(c: str) -> str:
+    # The str predicates of the per-character checks, isdigit() implies isalnum()
+    if c.isspace():
+        return SPACE
+    if c.isdigit():
+        return DIGIT
+    if c.isalnum():
+        return ALNUM
+    return OTHER
+
+
+class CharClasses(dict):
+    # str.translate table for non-ASCII characters, filled on first sight
+    def __missing__(self, code: int) -> str:
+        self[code] = char_class(chr(code))
+        return self[code]
+
+
+ASCII_CLASSES = bytes(ord(char_class(chr(code))) for code in range(128)) + bytes(128)
+char_classes = CharClasses()
+
+
+def char_counts(text: str) -> Tuple[int, int, int]:
+    # Non-alphanumeric non-space, digit and non-ASCII characters, in one translate of the ASCII part
+    ascii_classes = text.encode("ascii", "ignore").translate(ASCII_CLASSES)
+    non_ascii = len(text) - len(ascii_classes)
+    non_alnum = ascii_classes.count(OTHER.encode())
+    digits = ascii_classes.count(DIGIT.encode())
+    if non_ascii:
+        other_classes = "".join(NON_ASCII.findall(text)).translate(char_classes)
+        non_alnum += other_classes.count(OTHER)
+        digits += other_classes.count(DIGIT)
+    return non_alnum, digits, non_ascii
+
 
 def filter_lines(text: str,
                  min_words: int = 3,
                  max_chars_per_line: int = 500,
                  ) -> str:
     kept = []
+    matcher = get_phrase_matcher()
 
+    # Cheapest checks first, character statistics in one translate per line, the blacklist last
     for line in text.splitlines():
-        lw = line.strip().lower()
-        words = lw.split()
-        if len(words) < min_words:
-            continue
         if len(line) > max_chars_per_line:
             continue
-
-        if any(blk in lw for blk in BLACKLIST):
+        lw = line.strip().lower()
+        num_words = len(lw.split())
+        if num_words < min_words:
             continue
 
         if '<' in line or 'http://' in lw or 'https://' in lw:
             continue
 
-        non_alpha = sum(1 for c in line if not c.isalnum() and not c.isspace())
-        if non_alpha / max(1, len(words)) > 0.5:
+        non_alpha, digits, non_ascii = char_counts(line)
+        if non_ascii / max(1, len(line)) > 0.2:
+            continue
+        if non_alpha / max(1, num_words) > 0.5:
             continue
-
-        digits = sum(1 for c in line if c.isdigit())
         if digits / max(1, len(line)) > 0.2:
             continue
 
-        non_ascii = sum(1 for c in line if ord(c) > 127)
-        if non_ascii / max(1, len(line)) > 0.2:
+        if matcher.contains_any(lw, "blacklist"):
             continue
 
         kept.append(line)
@@ -1,57 +1,52 @@
-from nltk import word_tokenize
+from data_filtering.filtering_utilities.document_features import DocumentFeatures
 
-def gopher_quality_filters(text: str)-> bool:
-    words = word_tokenize(text)
+def gopher_quality_filters(text: "str | DocumentFeatures",
+                           min_words: int = 50,
+                           max_words: int = 100_000,
+                           min_mean_word_length: float = 3,
+                           max_mean_word_length: float = 10,
+                           min_alpha_ratio: float = 0.8,
+                           max_symbol_ratio: float = 0.1,
+                           min_stop_words: int = 2,
+                           max_ellipsis_ratio: float = 0.3)-> bool:
+    doc = DocumentFeatures.of(text)
 
-    if not words:
+    if not doc.num_words:
         return False
 
-    length_words = len(words)
+    length_words = doc.num_words
 
     # Contain less than 50 or more than 100,000 words.
-    if length_words < 50 or length_words > 100_000:
+    if length_words < min_words or length_words > max_words:
         return False
 
     # Have a mean word length outside the range of 3 to 10 characters
-    mean_word_length = sum(map(len, words)) / length_words
-
-    if not (3<= mean_word_length <= 10):
+    if not (min_mean_word_length <= doc.mean_word_length <= max_mean_word_length):
         return False
 
-    percentage_alpha = 0
-    nb_symbols = 0
-    stop_words = ["the", "be", "to", "of", "and", "that", "have", "with"]
-    num_stop_words = 0
-
-
-    for word in words:
-        if any(c.isalpha() for c in word):
-            percentage_alpha +=  1 / length_words
-        if word.strip() in ["#", "..."]:
-            nb_symbols += 1
-        if word.lower() in stop_words:
-            num_stop_words += 1
-
     # Contain less than 80% of words with at least one alphabetic character.
-    if percentage_alpha < 0.8:
+    # Summed 1/n at a time as the rule always has: the rounding rejects some documents at exactly 80%
+    percentage_alpha = 0
+    for _ in range(doc.alpha_words):
+        percentage_alpha += 1 / length_words
+    if percentage_alpha < min_alpha_ratio:
         return False
 
     # Symbol-to-word ratio greater than 0.1 for either the hash symbol or ellipsis
-    symbol_word_ratio = nb_symbols / length_words
-    if symbol_word_ratio > 0.1:
+    symbol_word_ratio = doc.symbol_words / length_words
+    if symbol_word_ratio > max_symbol_ratio:
         return False
 
     # remove documents that do not contain at least two of the following English words
-    if num_stop_words < 2:
+    if doc.stop_words < min_stop_words:
         return False
 
     # Have more than 30% of lines ending with an ellipsis (“...”).
-    lines = text.splitlines()
-    if not lines:
+    if not doc.num_lines:
         return False
 
-    percentage_ellipsis = sum(line.strip().endswith("...") for line in lines) / len(lines)
-    if percentage_ellipsis > 0.3:
+    percentage_ellipsis = doc.ellipsis_lines / doc.num_lines
+    if percentage_ellipsis > max_ellipsis_ratio:
         return False
 
-    return True
\ No newline at end of file
+    return True
@@ -1,7 +1,13 @@
-from typing import Tuple
+from typing import Tuple, List
+import numpy as np
+from data_filtering.filtering_utilities.fasttext_batch import clean_texts, predict_batch
 
 def classify_harmful_content(text: str,
                   model) -> Tuple[str, float]:
     cleaned_text = text.replace('\n', ' ')
     label, proba = model.predict(cleaned_text)
-    return label[0].replace("__label__", ""), float(proba[0])
\ No newline at end of file
+    return label[0].replace("__label__", ""), float(proba[0])
+
+def classify_harmful_content_batch(texts: List[str],
+                                   model) -> Tuple[np.ndarray, np.ndarray]:
+    return predict_batch(clean_texts(texts), model)
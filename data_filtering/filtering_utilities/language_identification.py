@@ -1,8 +1,52 @@
 import fasttext
-from typing import Tuple
+from typing import Tuple, List
+import numpy as np
+from data_filtering.filtering_utilities.fasttext_batch import clean_texts, predict_batch
 
 def language_identification(text: str,
                             model) -> Tuple[str, float]:
     cleaned_text = text.replace('\n', ' ')
     label, proba = model.predict(cleaned_text)
-    return label[0].replace("__label__", ""), float(proba[0])
\ No newline at end of file
+    return label[0].replace("__label__", ""), float(proba[0])
+
+def language_identification_batch(texts: List[str],
+                                  model) -> Tuple[np.ndarray, np.ndarray]:
+    return predict_batch(clean_texts(texts), model)
+
+
+def prefix_window(text: str,
+                  prefix_chars: int) -> str:
+    if len(text) <= prefix_chars:
+        return text
+    # Back off to a word boundary so the last token is not cut in half
+    cut = text.rfind(" ", prefix_chars // 2, prefix_chars)
+    return text[:cut if cut != -1 else prefix_chars]
+
+
+def language_identification_prefix_batch(texts: List[str],
+                                         model,
+                                         lang: str,
+                                         threshold: float,
+                                         prefix_chars: int = 2000,
+                                         margin: float = 0.05,
+                                         cleaned: bool = False) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Classifies a bounded prefix, and the full text only when the prefix decision is close to the threshold.
+    # Returns the labels, the scores and the mask of texts that fell back to the full text.
+    # cleaned: the texts already went through clean_texts
+    cleaned_texts = texts if cleaned else clean_texts(texts)
+    labels, probas = predict_batch([prefix_window(text, prefix_chars) for text in cleaned_texts], model)
+
+    # Under another label the target language scores at most 1 - proba, uncertain once that bound nears the threshold
+    truncated = np.array([len(text) > prefix_chars for text in cleaned_texts], dtype=bool)
+    uncertain = np.where(labels == lang, np.abs(probas - threshold) < margin, 1.0 - probas > threshold - margin)
+    fallback = truncated & uncertain
+
+    indices = np.flatnonzero(fallback)
+    if indices.size:
+        full_labels, full_probas = predict_batch([cleaned_texts[i] for i in indices], model)
+        # Fixed-width string arrays would truncate longer labels
+        labels = labels.astype(object)
+        labels[indices] = full_labels
+        probas[indices] = full_probas
+
+    return labels, probas, fallback
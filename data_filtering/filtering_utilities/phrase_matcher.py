@@ -0,0 +1,56 @@
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, Iterator, Set, Tuple
+
+import ahocorasick
+
+from data_filtering.filtering_utilities.filter_lists import BLACKLIST_CATEGORIES, DOMAIN_KEYWORD_CATEGORIES
+
+phrase_matcher = None
+
+
+class PhraseMatcher:
+    # Aho-Corasick automaton over named phrase lists: every occurrence of every phrase, overlapping
+    # ones included, in one pass over the text however many phrases there are
+    def __init__(self, phrase_lists: Dict[str, Dict[str, Iterable[str]]]):
+        # A phrase may appear in several lists and categories
+        owners = defaultdict(set)
+        for list_name, categories in phrase_lists.items():
+            for category, phrases in categories.items():
+                for phrase in phrases:
+                    owners[phrase].add((list_name, category))
+
+        self.automaton = ahocorasick.Automaton()
+        for phrase, phrase_owners in owners.items():
+            self.automaton.add_word(phrase, (phrase, frozenset(list_name for list_name, _ in phrase_owners),
+                                             tuple(sorted(phrase_owners))))
+        self.automaton.make_automaton()
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[str, frozenset, tuple]]:
+        if not text:
+            return
+        for _, match in self.automaton.iter(text):
+            yield match
+
+    def contains_any(self, text: str, list_name: str) -> bool:
+        # Stops at the first phrase of the list
+        return any(list_name in lists for _, lists, _ in self.iter_matches(text))
+
+    def matches(self, text: str, list_name: str) -> Set[str]:
+        return {phrase for phrase, lists, _ in self.iter_matches(text) if list_name in lists}
+
+    def category_hits(self, text: str, list_name: str) -> Dict[str, int]:
+        # Distinct phrases of each category found in the text
+        hits = Counter()
+        for phrase, lists, phrase_owners in {match[0]: match for match in self.iter_matches(text)}.values():
+            for owner_list, category in phrase_owners:
+                if owner_list == list_name:
+                    hits[category] += 1
+        return dict(hits)
+
+
+def get_phrase_matcher() -> PhraseMatcher:
+    # Built once per process from filter_lists, shared by the line filter and the quality heuristics
+    global phrase_matcher
+    if phrase_matcher is None:
+        phrase_matcher = PhraseMatcher({"blacklist": BLACKLIST_CATEGORIES, "domain": DOMAIN_KEYWORD_CATEGORIES})
+    return phrase_matcher
@@ -1,42 +1,41 @@
-import re
-from nltk import word_tokenize
 from data_filtering.filtering_utilities.gopher_quality_filters import gopher_quality_filters
-from data_filtering.filtering_utilities.filter_lists import DOMAIN_KEYWORDS
+from data_filtering.filtering_utilities.document_features import DocumentFeatures
 
-HTML_TAG_RE = re.compile(r'<\/?[a-z][^>]*>', re.IGNORECASE)
-URL_RE      = re.compile(r'https?://\S+')
+# Every rule takes the text or its DocumentFeatures, the features are computed once per document
 
-def lexical_diversity_ok(words, min_diversity=0.3):
-    return len(set(words)) / len(words) >= min_diversity
+def lexical_diversity_ok(text, min_diversity=0.3):
+    doc = DocumentFeatures.of(text)
+    return doc.unique_words / doc.num_words >= min_diversity
 
-def no_html_noise(text):
-    tokens = text.split()
-    bad = sum(bool(HTML_TAG_RE.search(tok) or URL_RE.search(tok)) for tok in tokens)
-    return bad / len(tokens) < 0.005
+def no_html_noise(text, max_ratio=0.005):
+    doc = DocumentFeatures.of(text)
+    return doc.noise_tokens / doc.num_tokens < max_ratio
 
 def punctuation_ratio_ok(text, max_ratio=0.2):
-    total = len(text)
+    doc = DocumentFeatures.of(text)
+    total = doc.num_chars
     if total == 0:
         return False
-    punct = sum(1 for c in text if not c.isalnum() and not c.isspace())
-    return (punct / total) <= max_ratio
+    return (doc.punctuation / total) <= max_ratio
 
-def numeric_ratio_ok(words, max_ratio=0.1):
-    nums = sum(1 for w in words if any(ch.isdigit() for ch in w))
-    return nums / len(words) <= max_ratio
+def numeric_ratio_ok(text, max_ratio=0.1):
+    doc = DocumentFeatures.of(text)
+    return doc.numeric_words / doc.num_words <= max_ratio
 
 def domain_coherence_ok(text, min_hits=2):
-    text_l = text.lower()
-    hits = sum(1 for kw in DOMAIN_KEYWORDS if kw in text_l)
-    return hits >= min_hits
+    return DocumentFeatures.of(text).domain_keywords >= min_hits
+
+def word_statistics_ok(text, min_diversity=0.3, max_numeric_ratio=0.1):
+    doc = DocumentFeatures.of(text)
+    return bool(doc.num_words) and lexical_diversity_ok(doc, min_diversity) and numeric_ratio_ok(doc, max_numeric_ratio)
 
 def super_quality_filter(text):
-    words = word_tokenize(text)
-    if not (gopher_quality_filters(text) and
-            lexical_diversity_ok(words) and
-            no_html_noise(text) and
-            punctuation_ratio_ok(text) and
-            numeric_ratio_ok(words) and
-            domain_coherence_ok(text)):
+    doc = DocumentFeatures.of(text)
+    if not (gopher_quality_filters(doc) and
+            lexical_diversity_ok(doc) and
+            no_html_noise(doc) and
+            punctuation_ratio_ok(doc) and
+            numeric_ratio_ok(doc) and
+            domain_coherence_ok(doc)):
         return False
     return True
\ No newline at end of file
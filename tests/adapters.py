@@ -1,27 +1,59 @@
 from __future__ import annotations
 
+import asyncio
 import os
+from pathlib import Path
 from typing import Any
+import aiohttp
 import fasttext
+import numpy as np
 
 from data_filtering.deduplication.exact_line_deduplication import exact_line_deduplication
 from data_filtering.deduplication.minhash_deduplication_parallel import minhash_deduplication_parallel
-from data_filtering.filtering_utilities.extract_text import extract_text
+from data_filtering.filtering_utilities.extract_text import decode_html, extract_text
 from data_filtering.filtering_utilities.gopher_quality_filters import gopher_quality_filters
 from data_filtering.filtering_utilities.harmful_content import classify_harmful_content
-from data_filtering.filtering_utilities.language_identification import language_identification
-from data_filtering.filtering_utilities.mask_pii import mask_emails, mask_phone_numbers, mask_ip_address
+from data_filtering.filtering_utilities.language_identification import (language_identification,
+                                                                        language_identification_prefix_batch)
+from data_filtering.filtering_utilities.mask_pii import mask_emails, mask_phone_numbers, mask_ip_address, mask_pii_batch
 from data_filtering.deduplication.minhash_deduplication import minhash_deduplication
 from data_filtering.deduplication.exact_line_deduplication_parallel import exact_line_dedup_parallel
+from data_filtering.data_pipeline.shards import ShardWriter, iter_documents, read_text
+from data_filtering.data_pipeline.stage_1.scheduler import ShardScheduler
+from data_filtering.data_pipeline.stage_1.ledger import ShardLedger
+from data_filtering.data_pipeline.stage_1.downloads import RangedDownload
+from data_filtering.data_pipeline.stage_1.split_records import RecordSplitter
+from data_filtering.data_pipeline.stage_1.extraction_guard import ExtractionGuard
+from data_filtering.data_pipeline.stage_1.seen_set import (SEEN_NAME, BloomFilter, SeenSet, merge_seen, reset_seen_set,
+                                                           seen_path)
+from data_filtering.data_pipeline.stage_1.score_sidecar import (ScoreSidecar, feature_columns, keep_mask, load_scores,
+                                                                replay_heuristic, scores_path)
+from data_filtering.data_pipeline.stage_1.rethreshold import all_heuristic_names, parse_args, rethreshold
+from data_filtering.data_pipeline.stage_1.processing_one_file import HEURISTICS
+from data_filtering.data_pipeline.stage_1.filter_chain import passes
+from data_filtering.filtering_utilities.document_features import DocumentFeatures
 
 def run_extract_text_from_html_bytes(html_bytes: bytes) -> str | None:
     return extract_text(html_bytes)
 
 
+def run_extract_text_with_charset(html_bytes: bytes, charset: str | None, stats: dict) -> str:
+    return extract_text(html_bytes, charset, stats)
+
+
+def run_decode_html(html_bytes: bytes, charset: str | None, stats: dict) -> str:
+    return decode_html(html_bytes, charset, stats)
+
+
 def run_identify_language(text: str) -> tuple[Any, float]:
     model = fasttext.load_model("classifier_models/fasttext_language_ID.bin")
     return language_identification(text, model)
 
+def run_identify_language_prefix(text: str, prefix_chars: int, confidence: float) -> tuple[Any, float]:
+    model = fasttext.load_model("classifier_models/fasttext_language_ID.bin")
+    labels, scores, _ = language_identification_prefix_batch([text], model, "en", confidence, prefix_chars)
+    return labels[0], float(scores[0])
+
 def run_mask_emails(text: str) -> tuple[str, int]:
     return mask_emails(text)
 
@@ -31,6 +63,9 @@ def run_mask_phone_numbers(text: str) -> tuple[str, int]:
 def run_mask_ips(text: str) -> tuple[str, int]:
     return mask_ip_address(text)
 
+def run_mask_pii_batch(texts: list[str]) -> tuple[list[str], list[dict]]:
+    return mask_pii_batch(texts)
+
 def run_classify_nsfw(text: str) -> tuple[Any, float]:
     model = fasttext.load_model("classifier_models/jigsaw_fasttext_bigrams_nsfw_final.bin")
     return classify_harmful_content(text, model)
@@ -49,9 +84,9 @@ def run_gopher_quality_filter(text: str) -> bool:
 
 
 def run_exact_line_deduplication(
-    input_files: list[os.PathLike], output_directory: os.PathLike
+    input_files: list[os.PathLike], output_directory: os.PathLike, backend: str = "memory"
 ):
-    return exact_line_dedup_parallel(input_files, output_directory)
+    return exact_line_dedup_parallel(input_files, output_directory, backend=backend)
 
 
 def run_minhash_deduplication(
@@ -63,3 +98,108 @@ def run_minhash_deduplication(
     output_directory: os.PathLike,
 ):
     return minhash_deduplication_parallel(input_files, num_hashes, num_bands, ngrams, jaccard_threshold, output_directory)
+
+
+def run_write_shard(texts: list[str], shard_path: os.PathLike) -> list[str]:
+    with ShardWriter(shard_path) as writer:
+        return [writer.write(text) for text in texts]
+
+
+def run_read_shard(shard_path: os.PathLike) -> list[tuple[str, str]]:
+    return list(iter_documents(shard_path))
+
+
+def run_read_document(path_or_ref: str) -> str:
+    return read_text(path_or_ref)
+
+
+def run_next_download_limit(args, metrics: list[dict]) -> list[int]:
+    # Download limits chosen by the Stage 1 controller after each metrics sample
+    scheduler = ShardScheduler(args)
+    limits = []
+    for sample in metrics:
+        scheduler.downloads.limit = scheduler.next_limit(sample)
+        scheduler._last_bandwidth = sample["bandwidth_MBps"]
+        limits.append(scheduler.downloads.limit)
+    return limits
+
+
+def run_score_sidecar(shard_path: os.PathLike, heuristics: list[str], batches: list[tuple[list[str], dict]]) -> str:
+    # Writes the candidates and scores of a shard from (final texts, score columns) batches
+    with ScoreSidecar(shard_path, heuristics) as sidecar:
+        for final_texts, columns in batches:
+            sidecar.add(final_texts, columns)
+    return str(scores_path(shard_path))
+
+
+def run_rethreshold_keep_mask(scores_file: os.PathLike, lang: str, confidence: float, nsfw_threshold: float,
+                              quality_threshold: float, heuristics: list[str] | None = None):
+    return keep_mask(load_scores(scores_file), lang, confidence, nsfw_threshold, quality_threshold, heuristics)
+
+
+def run_heuristic_names(scores_files: list[str]) -> list[str]:
+    return all_heuristic_names(scores_files)
+
+
+def run_rethreshold(argv: list[str]) -> dict:
+    return rethreshold(parse_args(argv))
+
+
+def run_heuristic_verdicts(texts: list[str], replay: bool) -> dict[str, list[bool]]:
+    # Verdicts of the Stage 1 heuristics on the texts, or replayed from the features a sidecar stores
+    documents = [DocumentFeatures(text) for text in texts]
+    if replay:
+        scores = {**feature_columns(documents), "final_bytes": np.zeros(len(texts), dtype=np.int32)}
+        return {name: replay_heuristic(scores, heuristic).tolist() for name, heuristic in HEURISTICS}
+    return {name: [passes(heuristic, doc) for doc in documents] for name, heuristic in HEURISTICS}
+
+
+def run_create_ledger(output_dir: os.PathLike, urls: list[str]) -> ShardLedger:
+    return ShardLedger.create(output_dir, urls)
+
+
+def run_resume_ledger(output_dir: os.PathLike) -> tuple[ShardLedger, list[str]]:
+    # What a run without --restart does: reload the ledger, clean up unfinished shards, return the shards left
+    ledger = ShardLedger.load(output_dir)
+    return ledger, ledger.recover()
+
+
+async def run_ranged_download(session: aiohttp.ClientSession, url: str, part_size: int, max_parts: int,
+                              chunk_size: int, retries: int = 0) -> bytes:
+    async with RangedDownload(session, url, part_size, max_parts, retries=retries, backoff=0.0) as download:
+        return b"".join([bytes(chunk) async for chunk in download.iter_chunked(chunk_size)])
+
+
+async def run_split_shard(source: os.PathLike, args, process_pool, shard_path: os.PathLike,
+                          cancel_after: float | None = None) -> tuple[list[str], dict]:
+    # --split_records on a local shard, cancelled after cancel_after seconds like a shard whose download fails
+    loop = asyncio.get_running_loop()
+    splitter = RecordSplitter(args, process_pool)
+    try:
+        task = asyncio.ensure_future(splitter.filter_shard(source, False, args, loop, shard_path))
+        if cancel_after is not None:
+            loop.call_later(cancel_after, task.cancel)
+        return await task
+    finally:
+        splitter.shutdown()
+
+
+def run_seen_keys(stage1_dir: os.PathLike, shard_path: os.PathLike, keys: list[str]) -> list[bool]:
+    # Worker side: checks the keys of a shard against the seen-set, then saves the shard's sidecar
+    seen = SeenSet(Path(stage1_dir) / SEEN_NAME)
+    flags = [seen.seen(key) for key in keys]
+    seen.save(seen_path(shard_path))
+    return flags
+
+
+def run_merge_seen(stage1_dir: os.PathLike, shard_path: os.PathLike, capacity: int, error_rate: float):
+    # Parent side, once the shard is done
+    merge_seen(BloomFilter.create(Path(stage1_dir) / SEEN_NAME, capacity, error_rate), shard_path)
+
+
+def run_reset_seen_set(stage1_dir: os.PathLike):
+    reset_seen_set(stage1_dir)
+
+
+def run_guarded_extraction(html_bytes: bytes, counts: dict, timeout: float | None) -> str | None:
+    return ExtractionGuard(timeout=timeout).extract(html_bytes, None, counts)
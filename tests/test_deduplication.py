@@ -2,7 +2,8 @@ import logging
 
 from xopen import xopen
 
-from .adapters import run_exact_line_deduplication, run_minhash_deduplication
+from .adapters import (run_exact_line_deduplication, run_minhash_deduplication, run_write_shard,
+                       run_read_shard, run_read_document)
 from .common import FIXTURES_PATH
 
 logger = logging.getLogger(__name__)
@@ -40,6 +41,44 @@ def test_exact_line_deduplication(tmp_path):
     assert len(deduplicated_documents) == 0
 
 
+def test_exact_line_deduplication_packed_shard(tmp_path):
+    documents_with_line_duplicates_paths = sorted(
+        (FIXTURES_PATH / "documents_with_line_duplicates").glob("doc*.txt")
+    )
+    documents = [path.read_text() for path in documents_with_line_duplicates_paths]
+    shard_path = tmp_path / "input.jsonl.gz"
+    doc_ids = run_write_shard(documents, shard_path)
+
+    for doc_id, document in zip(doc_ids, documents):
+        assert run_read_document(f"{shard_path}::{doc_id}") == document
+
+    output_directory = tmp_path / "output"
+    run_exact_line_deduplication(input_files=[shard_path], output_directory=output_directory)
+
+    # Same lines as the plain-text path, without the trailing newline of each file
+    deduplicated_documents = [
+        path.read_text().rstrip("\n")
+        for path in (FIXTURES_PATH / "documents_line_deduplicated").glob("doc*.txt")
+    ]
+    for _, text in run_read_shard(output_directory / "input.jsonl.gz"):
+        deduplicated_documents.remove(text)
+    assert all(not document for document in deduplicated_documents)
+
+
+def test_exact_line_deduplication_sqlite_backend(tmp_path):
+    documents_with_line_duplicates_paths = sorted(
+        (FIXTURES_PATH / "documents_with_line_duplicates").glob("doc*.txt")
+    )
+    memory_output, sqlite_output = tmp_path / "memory", tmp_path / "sqlite"
+    run_exact_line_deduplication(input_files=documents_with_line_duplicates_paths, output_directory=memory_output)
+    run_exact_line_deduplication(
+        input_files=documents_with_line_duplicates_paths, output_directory=sqlite_output, backend="sqlite"
+    )
+
+    for path in documents_with_line_duplicates_paths:
+        assert (sqlite_output / path.name).read_text() == (memory_output / path.name).read_text()
+
+
 def test_minhash_deduplication_exact_duplicates(tmp_path):
     """
     Check that minhash deduplication properly identifies and removes exact duplicates.
@@ -0,0 +1,88 @@
+import asyncio
+import os
+import threading
+import time
+from functools import partial
+from http import HTTPStatus
+from http.server import ThreadingHTTPServer
+
+import aiohttp
+import pytest
+
+from data_filtering.data_pipeline.local_server import RangeRequestHandler
+
+from .adapters import run_ranged_download
+
+SHARD = os.urandom(100_000)
+PART_SIZE = 7_000
+
+
+class FlakyRangeHandler(RangeRequestHandler):
+    # Ranges starting at or after fail_from get a 500
+    fail_from = None
+    # Ranges after the first and before fail_from answer late, so the failing ones are all done by then
+    delay = 0.0
+    # Answers with "bytes 0-N/*", so the total size is unknown
+    hide_total = False
+
+    def serve(self, send_body: bool):
+        start = int(self.headers.get("Range", "bytes=0-").split("=")[1].split("-")[0])
+        if self.fail_from is not None and start >= self.fail_from:
+            self.send_error(HTTPStatus.INTERNAL_SERVER_ERROR)
+            return
+        if start:
+            time.sleep(self.delay)
+        if self.hide_total and self.headers.get("Range"):
+            end = min(len(SHARD), start + PART_SIZE) - 1
+            self.send_response(HTTPStatus.PARTIAL_CONTENT)
+            self.send_header("Content-Length", str(end - start + 1))
+            self.send_header("Content-Range", f"bytes {start}-{end}/*")
+            self.end_headers()
+            self.wfile.write(SHARD[start:end + 1])
+            return
+        super().serve(send_body)
+
+
+@pytest.fixture
+def shard_server(tmp_path):
+    (tmp_path / "shard.warc.gz").write_bytes(SHARD)
+    servers = []
+
+    def serve(**handler_attrs) -> str:
+        handler = type("Handler", (FlakyRangeHandler,), handler_attrs)
+        server = ThreadingHTTPServer(("127.0.0.1", 0), partial(handler, directory=str(tmp_path)))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_port}/shard.warc.gz"
+
+    yield serve
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+async def download(url: str, max_parts: int) -> bytes:
+    async with aiohttp.ClientSession() as session:
+        return await run_ranged_download(session, url, PART_SIZE, max_parts, chunk_size=1_000)
+
+
+@pytest.mark.parametrize("max_parts", [1, 2, 4, 16])
+def test_ranged_download_yields_shard_in_order(shard_server, max_parts):
+    assert asyncio.run(download(shard_server(), max_parts)) == SHARD
+
+
+def test_ranged_download_refetches_without_total_size(shard_server):
+    assert asyncio.run(download(shard_server(hide_total=True), 4)) == SHARD
+
+
+def test_ranged_download_failure_awaits_other_ranges(shard_server):
+    url = shard_server(fail_from=3 * PART_SIZE, delay=0.5)
+
+    async def failed_download():
+        async with aiohttp.ClientSession() as session:
+            with pytest.raises(aiohttp.ClientResponseError):
+                await run_ranged_download(session, url, PART_SIZE, 8, chunk_size=1_000)
+            # The cancelled ranges are finished, and their responses released, by the time the download exits
+            return asyncio.all_tasks() - {asyncio.current_task()}
+
+    assert asyncio.run(failed_download()) == set()
@@ -1,6 +1,6 @@
 import logging
 
-from .adapters import run_extract_text_from_html_bytes
+from .adapters import run_decode_html, run_extract_text_from_html_bytes, run_extract_text_with_charset
 from .common import FIXTURES_PATH
 
 logger = logging.getLogger(__name__)
@@ -14,3 +14,50 @@ def test_extract_text_from_html_bytes():
     with open(moby_expected_path, encoding="utf-8") as f:
         moby_expected_text = f.read()
     assert moby_expected_text == run_extract_text_from_html_bytes(moby_bytes)
+
+
+def test_decode_html_utf8():
+    stats = {}
+    html = "<p>Café, naïve, 日本語</p>"
+    # A valid UTF-8 payload wins over a wrong header charset
+    assert run_decode_html(html.encode("utf-8"), "iso-8859-1", stats) == html
+    assert stats == {"encoding.utf8": 1}
+
+
+def test_decode_html_header_charset():
+    stats = {}
+    html = "<p>Café crème, 5 € à emporter</p>"
+    assert run_decode_html(html.encode("cp1252"), "windows-1252", stats) == html
+    assert stats == {"encoding.header": 1}
+
+
+def test_decode_html_meta_charset():
+    stats = {}
+    html = '<html><head><meta charset="iso-8859-1"></head><body><p>Smørrebrød</p></body></html>'
+    assert run_decode_html(html.encode("latin-1"), None, stats) == html
+    # A label the payload is not valid in falls through to the next path
+    assert run_decode_html(html.encode("latin-1"), "utf-16", stats) == html
+    assert stats == {"encoding.meta": 2}
+
+
+def test_decode_html_detection_fallback():
+    stats = {}
+    html = "<p>Привет, мир! Это проверка определения кодировки страницы без заголовка.</p>" * 4
+    decoded = run_decode_html(html.encode("cp1251"), "no-such-charset", stats)
+    assert stats == {"encoding.detect": 1}
+    assert "<p>" in decoded
+
+
+def test_decode_html_strips_bom():
+    stats = {}
+    assert run_decode_html("\ufeff<p>text</p>".encode("utf-8"), None, stats) == "<p>text</p>"
+    assert run_decode_html("\ufeff<p>text</p>".encode("utf-16-le"), "utf-16le", stats) == "<p>text</p>"
+    assert stats == {"encoding.utf8": 1, "encoding.header": 1}
+
+
+def test_extract_text_counts_into_plain_dict():
+    # The counters are a plain dict outside of ShardStats, a first increment must not raise
+    stats = {}
+    assert run_extract_text_with_charset(b"<html><body><p>Some text</p></body></html>", None, stats) == "Some text"
+    assert run_extract_text_with_charset("<p>Café</p>".encode("cp1252"), "windows-1252", stats) == "Café"
+    assert stats == {"encoding.utf8": 1, "encoding.header": 1}
@@ -0,0 +1,28 @@
+import time
+from collections import defaultdict
+
+from data_filtering.data_pipeline.stage_1 import extraction_guard
+
+from .adapters import run_guarded_extraction
+
+
+def slow_extract_text(html_bytes: bytes, charset: str | None, stats: dict) -> str:
+    time.sleep(0.3)
+    stats["encoding.utf8"] += 1
+    return html_bytes.decode()
+
+
+def test_guarded_extraction_counts_when_in_time(monkeypatch):
+    monkeypatch.setattr(extraction_guard, "extract_text", slow_extract_text)
+    counts = defaultdict(int)
+    assert run_guarded_extraction(b"<p>text</p>", counts, timeout=5.0) == "<p>text</p>"
+    assert counts == {"encoding.utf8": 1}
+
+
+def test_abandoned_extraction_does_not_count(monkeypatch):
+    # The shard's stats may already be written when the abandoned thread finishes
+    monkeypatch.setattr(extraction_guard, "extract_text", slow_extract_text)
+    counts = defaultdict(int)
+    assert run_guarded_extraction(b"<p>text</p>", counts, timeout=0.05) is None
+    time.sleep(0.5)
+    assert counts == {}
@@ -1,6 +1,6 @@
 import logging
 
-from .adapters import run_identify_language
+from .adapters import run_identify_language, run_identify_language_prefix
 from .common import FIXTURES_PATH
 
 logger = logging.getLogger(__name__)
@@ -22,3 +22,12 @@ def test_identify_language_chinese_simplified():
     assert predicted_language == "zh"
     assert isinstance(score, float)
     assert score > 0
+
+def test_identify_language_prefix_matches_full_text():
+    wiki_path = FIXTURES_PATH / "high_quality_wiki_reference.txt"
+    with open(wiki_path, encoding="utf-8") as f:
+        wiki_text = f.read()
+    predicted_language, _ = run_identify_language(wiki_text)
+    prefix_language, score = run_identify_language_prefix(wiki_text, prefix_chars=1000, confidence=0.9)
+    assert prefix_language == predicted_language
+    assert isinstance(score, float)
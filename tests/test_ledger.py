@@ -0,0 +1,62 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from .adapters import run_create_ledger, run_resume_ledger
+
+URLS = [f"http://127.0.0.1/crawl-data/X/segments/a/warc/shard-{i}.warc.gz" for i in range(3)]
+
+
+def write_outputs(ledger, url: str):
+    for path in ledger.shard_outputs(url)[:3]:
+        path.write_text("partial")
+
+
+def test_ledger_create_starts_every_shard_pending(tmp_path):
+    ledger = run_create_ledger(tmp_path, URLS)
+    data = json.loads(ledger.path.read_text(encoding="utf-8"))
+    assert data["urls"] == URLS
+    assert {shard["state"] for shard in data["shards"].values()} == {"pending"}
+    assert ledger.unfinished() == URLS
+    assert ledger.manifests() == []
+
+
+def test_ledger_recover_cleans_up_unfinished_shards(tmp_path):
+    ledger = run_create_ledger(tmp_path, URLS)
+    for url in URLS[:2]:
+        ledger.mark_in_flight(url)
+        write_outputs(ledger, url)
+    manifest_path = ledger.shard_outputs(URLS[0])[2]
+    ledger.mark_done(URLS[0], manifest_path)
+
+    # The run dies with URLS[1] in flight
+    ledger, unfinished = run_resume_ledger(tmp_path)
+    assert unfinished == URLS[1:]
+    assert ledger.manifests() == [str(manifest_path)]
+    assert all(path.exists() for path in ledger.shard_outputs(URLS[0])[:3])
+    assert not any(path.exists() for path in ledger.shard_outputs(URLS[1]))
+    assert ledger.shards[URLS[1]] == {"state": "pending", "manifest": None}
+
+
+def test_ledger_mark_failed_removes_outputs(tmp_path):
+    ledger = run_create_ledger(tmp_path, URLS)
+    ledger.mark_in_flight(URLS[0])
+    write_outputs(ledger, URLS[0])
+    ledger.mark_failed(URLS[0], "ClientError()")
+
+    assert not any(path.exists() for path in ledger.shard_outputs(URLS[0]))
+    ledger, unfinished = run_resume_ledger(tmp_path)
+    assert unfinished == URLS
+    assert ledger.shards[URLS[0]]["state"] == "pending"
+    assert ledger.shards[URLS[0]]["error"] == "ClientError()"
+
+
+def test_ledger_marks_from_threads_are_all_saved(tmp_path):
+    # main.py marks shards from executor threads
+    urls = [f"http://127.0.0.1/shard-{i}.warc.gz" for i in range(64)]
+    ledger = run_create_ledger(tmp_path, urls)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda url: ledger.mark_done(url, f"{url}.manifest"), urls))
+
+    ledger, unfinished = run_resume_ledger(tmp_path)
+    assert unfinished == []
+    assert ledger.manifests() == [f"{url}.manifest" for url in urls]
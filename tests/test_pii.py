@@ -1,6 +1,6 @@
 import logging
 
-from .adapters import run_mask_emails, run_mask_ips, run_mask_phone_numbers
+from .adapters import run_mask_emails, run_mask_ips, run_mask_phone_numbers, run_mask_pii_batch
 
 logger = logging.getLogger(__name__)
 
@@ -57,3 +57,26 @@ def test_mask_ips():
     masked_text, num_masked = run_mask_ips(test_string)
     assert masked_text == expected_masked_text
     assert num_masked == 1
+
+
+def test_mask_pii_batch():
+    test_strings = [
+        "Mail test@gmail.com or call (283) 182 3829, the server is at 192.0.2.146.",
+        "Nothing to mask here.",
+    ]
+    expected_masked_texts = [
+        "Mail |||EMAIL_ADDRESS||| or call |||PHONE_NUMBER|||, the server is at |||IP_ADDRESS|||.",
+        "Nothing to mask here.",
+    ]
+    masked_texts, counts = run_mask_pii_batch(test_strings)
+    assert masked_texts == expected_masked_texts
+    assert counts[0] == {"email": 1, "phone_numbers": 1, "ip_address": 1}
+    assert counts[1] == {"email": 0, "phone_numbers": 0, "ip_address": 0}
+
+    # \d matches any decimal digit, so the batch masker must not skip these like ASCII-only text
+    test_strings = ["call ０１２３ ４５６７８９ now", "اتصل ٠١٢٣ ٤٥٦٧٨٩ الآن"]
+    masked_texts, counts = run_mask_pii_batch(test_strings)
+    for test_string, masked_text, text_counts in zip(test_strings, masked_texts, counts):
+        expected_masked_text, num_phone_numbers = run_mask_phone_numbers(test_string)
+        assert masked_text == expected_masked_text
+        assert text_counts["phone_numbers"] == num_phone_numbers == 1
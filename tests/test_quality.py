@@ -1,6 +1,11 @@
 import logging
+import re
 
-from .adapters import run_classify_quality, run_gopher_quality_filter
+from nltk import word_tokenize
+
+from data_filtering.filtering_utilities.phrase_matcher import get_phrase_matcher
+
+from .adapters import run_classify_quality, run_gopher_quality_filter, run_heuristic_verdicts
 from .common import FIXTURES_PATH
 
 logger = logging.getLogger(__name__)
@@ -90,3 +95,74 @@ def test_gopher_less_than_80_percent_words_with_alphabetic_character():
     words += ["word" for _ in range(2)]
     text = "the and " + " ".join(words)
     assert not run_gopher_quality_filter(text)
+
+
+
+# The heuristics as they were before DocumentFeatures: every rule tokenizes and scans the text itself
+def gopher_reference(text):
+    words = word_tokenize(text)
+    if not words or len(words) < 50 or len(words) > 100_000:
+        return False
+    if not (3 <= sum(map(len, words)) / len(words) <= 10):
+        return False
+    percentage_alpha = 0
+    nb_symbols = num_stop_words = 0
+    for word in words:
+        if any(c.isalpha() for c in word):
+            percentage_alpha += 1 / len(words)
+        if word.strip() in ["#", "..."]:
+            nb_symbols += 1
+        if word.lower() in ["the", "be", "to", "of", "and", "that", "have", "with"]:
+            num_stop_words += 1
+    if percentage_alpha < 0.8 or nb_symbols / len(words) > 0.1 or num_stop_words < 2:
+        return False
+    lines = text.splitlines()
+    return bool(lines) and sum(line.strip().endswith("...") for line in lines) / len(lines) <= 0.3
+
+
+def word_statistics_reference(text):
+    words = word_tokenize(text)
+    return (bool(words) and len(set(words)) / len(words) >= 0.3 and
+            sum(1 for w in words if any(ch.isdigit() for ch in w)) / len(words) <= 0.1)
+
+
+def html_noise_reference(text):
+    tokens = text.split()
+    bad = sum(bool(re.search(r'<\/?[a-z][^>]*>', tok, re.IGNORECASE) or re.search(r'https?://\S+', tok))
+              for tok in tokens)
+    return bad / len(tokens) < 0.005
+
+
+def punctuation_ratio_reference(text):
+    return bool(text) and sum(1 for c in text if not c.isalnum() and not c.isspace()) / len(text) <= 0.2
+
+
+def domain_coherence_reference(text):
+    return len(get_phrase_matcher().matches(text.lower(), "domain")) >= 2
+
+
+REFERENCE_HEURISTICS = {
+    "gopher": gopher_reference,
+    "word_statistics": word_statistics_reference,
+    "html_noise": html_noise_reference,
+    "punctuation_ratio": punctuation_ratio_reference,
+    "domain_coherence": domain_coherence_reference,
+}
+
+
+def reference_verdict(heuristic, text) -> bool:
+    try:
+        return heuristic(text)
+    except ZeroDivisionError:
+        return False
+
+
+def test_shared_features_match_per_rule_heuristics():
+    texts = [path.read_text(encoding="utf-8") for path in sorted(FIXTURES_PATH.rglob("*.txt"))]
+    texts += [text[:len(text) // 7] for text in texts] + ["", "...", "<p> https://example.com </p> the and " * 20]
+    # Exactly 80% of the words have a letter: the summed 1/n falls just below 0.8 for some word counts
+    texts += [" ".join(["the"] * (4 * n // 5) + ["123"] * (n // 5)) for n in range(50, 2001, 5)]
+
+    expected = {name: [reference_verdict(heuristic, text) for text in texts]
+                for name, heuristic in REFERENCE_HEURISTICS.items()}
+    assert run_heuristic_verdicts(texts, replay=False) == expected
@@ -0,0 +1,24 @@
+from argparse import Namespace
+
+from .adapters import run_next_download_limit
+
+
+def scheduler_args(stream: bool) -> Namespace:
+    return Namespace(num_workers=4, max_concurrent_downloads=8, fixed_download_concurrency=False, stream=stream)
+
+
+def saturated_metrics(download_limit: int) -> dict:
+    # Every task queued on a worker slot, every worker slot taken
+    return {"download_limit": download_limit, "downloading": 4.0, "waiting_for_cpu": 20.0,
+            "worker_utilization": 1.0, "bandwidth_MBps": 50.0}
+
+
+def test_download_limit_backs_off_when_spilled_shards_wait_for_workers():
+    limits = run_next_download_limit(scheduler_args(stream=False), [saturated_metrics(4)] * 5)
+    assert limits == [3, 2, 1, 1, 1]
+
+
+def test_download_limit_holds_in_stream_mode():
+    # Streamed tasks wait for a worker before downloading, the queue is no sign of downloads running ahead
+    limits = run_next_download_limit(scheduler_args(stream=True), [saturated_metrics(8)] * 20)
+    assert limits == [8] * 20
@@ -0,0 +1,95 @@
+import json
+
+import numpy as np
+import pytest
+
+from .adapters import (run_heuristic_names, run_heuristic_verdicts, run_rethreshold, run_rethreshold_keep_mask,
+                       run_score_sidecar)
+from .common import FIXTURES_PATH
+
+# Features of a document every heuristic keeps at its Stage 1 cutoffs
+LONG_DOCUMENT = {"num_chars": 600, "num_words": 100, "word_chars": 450, "unique_words": 60, "alpha_words": 95,
+                 "symbol_words": 0, "stop_words": 10, "numeric_words": 2, "num_lines": 5, "ellipsis_lines": 0,
+                 "num_tokens": 100, "noise_tokens": 0, "punctuation": 20, "domain_keywords": 3}
+# Too few words for gopher
+SHORT_DOCUMENT = {**LONG_DOCUMENT, "num_chars": 120, "num_words": 20, "word_chars": 90, "unique_words": 15,
+                  "alpha_words": 19, "stop_words": 3, "num_tokens": 20}
+
+
+def score_columns(features: list[dict], verdicts: dict[str, list[bool]]) -> dict:
+    num_docs = len(features)
+    return {
+        "lang": np.array(["en"] * num_docs), "lang_score": np.full(num_docs, 0.95),
+        **{f"ok_{name}": np.array(passed, dtype=bool) for name, passed in verdicts.items()},
+        "nsfw_label": np.array(["non-nsfw"] * num_docs), "nsfw_score": np.full(num_docs, 0.99),
+        "quality_label": np.array(["good"] * num_docs), "quality_score": np.full(num_docs, 0.9),
+        "extracted_chars": np.array([doc["num_chars"] for doc in features], dtype=np.int32),
+        "final_bytes": np.array([doc["num_chars"] for doc in features], dtype=np.int32),
+        **{name: np.array([doc[name] for doc in features], dtype=np.int32) for name in LONG_DOCUMENT},
+    }
+
+
+def test_empty_shard_scores(tmp_path):
+    # A shard without any extracted document sorts first and must not hide the heuristics of the others
+    empty = run_score_sidecar(tmp_path / "a.jsonl.gz", ["gopher"], [])
+    columns = score_columns([LONG_DOCUMENT, SHORT_DOCUMENT], {"gopher": [True, False]})
+    full = run_score_sidecar(tmp_path / "b.jsonl.gz", ["gopher"], [(["doc 1", "doc 2"], columns)])
+
+    heuristics = run_heuristic_names([empty, full])
+    assert heuristics == ["gopher"]
+
+    assert run_rethreshold_keep_mask(empty, "en", 0.9, 0.9, 0.8, heuristics).shape == (0,)
+    assert run_rethreshold_keep_mask(full, "en", 0.9, 0.9, 0.8, heuristics).tolist() == [True, False]
+    assert run_rethreshold_keep_mask(full, "en", 0.9, 0.9, 0.8, []).all()
+
+
+def write_shards(stage1_dir):
+    # Two runs scored their shards with different heuristics
+    stage1_dir.mkdir()
+    columns = score_columns([LONG_DOCUMENT, SHORT_DOCUMENT], {"gopher": [True, False]})
+    run_score_sidecar(stage1_dir / "a.jsonl.gz", ["gopher"], [(["long a", "short a"], columns)])
+    columns = score_columns([SHORT_DOCUMENT, LONG_DOCUMENT],
+                            {"gopher": [False, True], "domain_coherence": [True, True]})
+    run_score_sidecar(stage1_dir / "b.jsonl.gz", ["gopher", "domain_coherence"], [(["short b", "long b"], columns)])
+
+
+def rethreshold_args(stage1_dir, output_dir, *flags) -> list[str]:
+    return ["--STAGE1_DIR", str(stage1_dir), "--output_dir", str(output_dir), *flags]
+
+
+def test_rethreshold_shards_with_different_heuristics(tmp_path):
+    write_shards(tmp_path / "stage1")
+    totals = run_rethreshold(rethreshold_args(tmp_path / "stage1", tmp_path / "out"))
+    assert totals["candidates"] == 4
+    assert totals["kept"] == 2
+    report = json.loads((tmp_path / "out" / "rethreshold_report.json").read_text())
+    assert report["thresholds"]["heuristics"] == ["gopher", "domain_coherence"]
+
+
+def test_rethreshold_moves_heuristic_cutoffs(tmp_path):
+    write_shards(tmp_path / "stage1")
+    totals = run_rethreshold(rethreshold_args(tmp_path / "stage1", tmp_path / "out", "--gopher_min_words", "10"))
+    assert totals["kept"] == 4
+    totals = run_rethreshold(rethreshold_args(tmp_path / "stage1", tmp_path / "out", "--min_domain_keywords", "4"))
+    assert totals["kept"] == 0
+
+
+def test_rethreshold_rejects_sidecars_without_features(tmp_path):
+    write_shards(tmp_path / "stage1")
+    # As written before the features were stored
+    old_scores = tmp_path / "stage1" / "b.scores.npz"
+    with np.load(old_scores) as npz:
+        columns = {key: npz[key] for key in npz.files if key not in LONG_DOCUMENT}
+    np.savez_compressed(old_scores, **columns)
+
+    with pytest.raises(SystemExit, match="b.scores.npz lacks the feature columns"):
+        run_rethreshold(rethreshold_args(tmp_path / "stage1", tmp_path / "out"))
+    assert not (tmp_path / "out" / "a.jsonl.gz").exists()
+    # Without heuristics no feature is needed
+    assert run_rethreshold(rethreshold_args(tmp_path / "stage1", tmp_path / "out", "--heuristics"))["kept"] == 4
+
+
+def test_replayed_heuristics_match_live_verdicts():
+    texts = [path.read_text(encoding="utf-8") for path in sorted(FIXTURES_PATH.rglob("*.txt"))]
+    texts += [text[:len(text) // 3] for text in texts] + ["", "word " * 60, "<a href='x'>link</a> ... " * 30]
+    assert run_heuristic_verdicts(texts, replay=True) == run_heuristic_verdicts(texts, replay=False)
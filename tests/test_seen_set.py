@@ -0,0 +1,44 @@
+from .adapters import run_merge_seen, run_reset_seen_set, run_seen_keys
+
+CAPACITY, ERROR_RATE = 10_000, 0.001
+
+
+def keys(prefix: str, num_keys: int) -> list[str]:
+    return [f"url:example.com/{prefix}/{i}" for i in range(num_keys)]
+
+
+def test_seen_set_finds_repeats_within_a_shard(tmp_path):
+    flags = run_seen_keys(tmp_path, tmp_path / "a.jsonl.gz", ["url:a", "url:b", "url:a", "url:b", "url:c"])
+    assert flags == [False, False, True, True, False]
+
+
+def test_seen_set_finds_keys_of_merged_shards_only(tmp_path):
+    first, second = keys("first", 1_000), keys("second", 1_000)
+    assert not any(run_seen_keys(tmp_path, tmp_path / "a.jsonl.gz", first))
+    # Until the shard is merged, another shard does not see its keys
+    assert not any(run_seen_keys(tmp_path, tmp_path / "b.jsonl.gz", first))
+
+    run_merge_seen(tmp_path, tmp_path / "a.jsonl.gz", CAPACITY, ERROR_RATE)
+    assert all(run_seen_keys(tmp_path, tmp_path / "c.jsonl.gz", first))
+    false_positives = sum(run_seen_keys(tmp_path, tmp_path / "d.jsonl.gz", second))
+    assert false_positives <= 10 * ERROR_RATE * len(second)
+
+
+def test_seen_set_merge_adds_to_existing_filter(tmp_path):
+    first, second = keys("first", 100), keys("second", 100)
+    run_seen_keys(tmp_path, tmp_path / "a.jsonl.gz", first)
+    run_seen_keys(tmp_path, tmp_path / "b.jsonl.gz", second)
+    run_merge_seen(tmp_path, tmp_path / "a.jsonl.gz", CAPACITY, ERROR_RATE)
+    run_merge_seen(tmp_path, tmp_path / "b.jsonl.gz", CAPACITY, ERROR_RATE)
+    assert all(run_seen_keys(tmp_path, tmp_path / "c.jsonl.gz", first + second))
+
+
+def test_seen_set_reset_forgets_previous_runs(tmp_path):
+    first = keys("first", 100)
+    run_seen_keys(tmp_path, tmp_path / "a.jsonl.gz", first)
+    run_merge_seen(tmp_path, tmp_path / "a.jsonl.gz", CAPACITY, ERROR_RATE)
+
+    # A new run samples the same shards again, their records are not duplicates of the previous run
+    run_reset_seen_set(tmp_path)
+    assert not any(run_seen_keys(tmp_path, tmp_path / "a.jsonl.gz", first))
+    run_reset_seen_set(tmp_path)
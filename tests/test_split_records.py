@@ -0,0 +1,65 @@
+import asyncio
+import concurrent.futures
+import gzip
+import os
+import threading
+from argparse import Namespace
+from pathlib import Path
+
+import pytest
+
+from data_filtering.data_pipeline.stage_1.record_batches import pack_records, unpack_records
+
+from .adapters import run_split_shard
+
+SHM_DIR = Path("/dev/shm")
+
+
+def write_warc(path: Path, num_records: int):
+    # One gzip member per record, like a Common Crawl shard
+    with open(path, "wb") as f:
+        for i in range(num_records):
+            payload = (f"HTTP/1.1 200 OK\r\nContent-Type: text/html; charset=utf-8\r\n\r\n"
+                       f"<html><body><p>Page {i}</p></body></html>").encode()
+            header = (f"WARC/1.0\r\nWARC-Type: response\r\nWARC-Record-ID: <urn:uuid:{i:08d}-0000-0000-0000-000000000000>\r\n"
+                      f"WARC-Date: 2025-05-01T00:00:00Z\r\nWARC-Target-URI: http://example.com/{i}\r\n"
+                      f"Content-Type: application/http; msgtype=response\r\nContent-Length: {len(payload)}\r\n\r\n").encode()
+            f.write(gzip.compress(header + payload + b"\r\n\r\n"))
+
+
+def split_args() -> Namespace:
+    return Namespace(num_workers=1, max_concurrent_downloads=1, records_per_task=1, use_wet=False,
+                     header_filter=False, seen_set=False)
+
+
+class DyingWorkerPool(concurrent.futures.Executor):
+    # Every batch fails after a while, without its worker unlinking the block
+    def submit(self, fn, *args, **kwargs):
+        future = concurrent.futures.Future()
+        threading.Timer(0.2, future.set_exception, (RuntimeError("worker died"),)).start()
+        return future
+
+
+def shared_blocks() -> set:
+    return {path.name for path in SHM_DIR.glob("psm_*")}
+
+
+def test_record_batches_round_trip():
+    payloads = [b"first record", b"", b"third \x00 record"]
+    shm_name, offsets = pack_records(payloads)
+    assert unpack_records(shm_name, offsets) == payloads
+    # The worker unlinks the block once it has read it
+    assert shm_name not in shared_blocks()
+
+
+@pytest.mark.skipif(not SHM_DIR.is_dir(), reason="needs /dev/shm to count shared blocks")
+def test_split_shard_releases_batches_when_cancelled(tmp_path):
+    source = tmp_path / "shard.warc.gz"
+    write_warc(source, 50)
+    before = shared_blocks()
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(run_split_shard(source, split_args(), DyingWorkerPool(), tmp_path / "shard.jsonl.gz",
+                                    cancel_after=0.1))
+    # Queued batches and those the reader was still sending reach no worker
+    assert shared_blocks() - before == set()